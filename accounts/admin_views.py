@@ -15,7 +15,9 @@ from accounts.models import UserAccount
 from shop.models import Product, Category, Brand
 from order.models import Order, OrderItem
 from cart.cart import Cart
-from order.shipping import compute_shipping, method_name
+from shop.inventory import InsufficientStock
+from order.services import place_order
+from order.shipping import method_name, quote_cart
 
 # Persistencia MockDB
 try:
@@ -582,9 +584,11 @@ def checkout_delivery(request: HttpRequest) -> HttpResponse:
             return redirect(reverse('accounts:admin_checkout_payment'))
     else:
         form = DeliveryForm()
-    subtotal = float(cart.get_total_price())
+    snapshot = cart.snapshot()
+    subtotal = float(snapshot.total)
     method_code = form.fields['shipping_method'].initial or 'home'
-    shipping_estimate = compute_shipping(subtotal, method_code)
+    # Aún sin dirección: se estima con la zona por defecto
+    shipping_estimate = quote_cart(snapshot, method_code).price
     total_estimate = subtotal + shipping_estimate
     return render(request, 'accounts/admin/checkout/delivery.html', {
         'cart': cart,
@@ -603,51 +607,30 @@ def checkout_payment(request: HttpRequest) -> HttpResponse:
         return redirect(reverse('accounts:admin_checkout_delivery'))
     if request.method == 'POST':
         form = PaymentForm(request.POST)
+        snapshot = cart.snapshot()
+        if not snapshot.is_valid:
+            return redirect('cart:cart_detail')
         if form.is_valid():
+            # Stock, pedido y líneas en una sola operación (ver order/services.py)
             payment_method = form.cleaned_data['payment_method']
-            subtotal = float(cart.get_total_price())
-            method_code = data.get('shipping_method', 'home')
-            shipping_cost = compute_shipping(subtotal, method_code)
-            total = subtotal + shipping_cost
-            order_status = 'processing' if payment_method == 'cod' else 'pending'
-            next_id = getattr(Order.objects, '_next_id', 1)
-            order = Order.objects.create(
-                id=next_id,
-                first_name=data.get('first_name', ''),
-                last_name=data.get('last_name', ''),
-                email=data.get('email', ''),
-                address=data.get('address', ''),
-                postal_code=data.get('postal_code', ''),
-                city=data.get('city', ''),
-                order_number=f"MOCK-{next_id:04d}",
-                status=order_status,
-                subtotal=str(subtotal),
-                shipping_cost=str(shipping_cost),
-                shipping_method=method_code,
-                taxes='0', discount='0', total=str(total),
-                paid=bool(payment_method == 'gateway'),
-                payment_method=payment_method,
-            )
-            for item in cart:
-                OrderItem.objects.create(order=order, product=item['product'], price=item['price'], quantity=item['quantity'])
-                try:
-                    prod = item['product']
-                    qty = int(item['quantity'])
-                    if hasattr(prod, 'stock'):
-                        prod.stock = max(0, int(getattr(prod, 'stock', 0)) - qty)
-                except Exception:
-                    pass
-            save_orders_to_fixture()
-            save_order_items_to_fixture()
-            save_products_to_fixture()
+            details = dict(data, payment_method=payment_method)
+            try:
+                order = place_order(
+                    cart, snapshot, details,
+                    status='processing' if payment_method == 'cod' else 'pending',
+                    paid=payment_method == 'gateway',
+                )
+            except InsufficientStock:
+                return redirect('cart:cart_detail')
             cart.clear()
             request.session.pop(ADMIN_CHECKOUT_KEY, None)
             return render(request, 'accounts/admin/checkout/created.html', {'order': order})
     else:
         form = PaymentForm()
-    subtotal = float(cart.get_total_price())
+    snapshot = cart.snapshot()
+    subtotal = float(snapshot.total)
     method_code = data.get('shipping_method', 'home')
-    shipping_cost = compute_shipping(subtotal, method_code)
+    shipping_cost = quote_cart(snapshot, method_code, data.get('postal_code', '')).price
     total = subtotal + shipping_cost
     return render(request, 'accounts/admin/checkout/payment.html', {
         'cart': cart,
@@ -1,31 +1,207 @@
-from decimal import Decimal
+import uuid
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, List, Optional
 from django.conf import settings
+from shop.catalog import effective_price
+from shop.inventory import InsufficientStock, ledger
 from shop.models import Product
 
+# Session key holding the reservation token of a guest cart
+CART_HOLD_SESSION_KEY = 'cart_hold'
+
+# Session format: {"v": 2, "l": [[product_id, size, quantity, price_cents], ...]}
+# Version 1 (legacy) was a dict of "<product_id>_<size>" -> line dict.
+CART_FORMAT_VERSION = 2
+
+
+def _cart_key(product_id, size):
+    return f"{product_id}_{size}" if size else str(product_id)
+
+
+def _to_cents(price):
+    try:
+        return int((Decimal(str(price)) * 100).quantize(Decimal('1')))
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def decode_cart(raw):
+    """
+    Turn the session value (compact or legacy) into the in-memory line dict.
+    """
+    lines = {}
+    if isinstance(raw, dict) and raw.get('v') == CART_FORMAT_VERSION:
+        for entry in raw.get('l', []):
+            try:
+                product_id, size, quantity, cents = entry
+                lines[_cart_key(product_id, size)] = {
+                    'quantity': int(quantity),
+                    'price': str(Decimal(int(cents)) / 100),
+                    'product_id': str(product_id),
+                    'size': size,
+                }
+            except (TypeError, ValueError):
+                continue
+    elif isinstance(raw, dict):
+        # Legacy format: only the stored fields are kept, derived ones are dropped
+        for key, item in raw.items():
+            if not isinstance(item, dict):
+                continue
+            try:
+                lines[key] = {
+                    'quantity': int(item.get('quantity', 0)),
+                    'price': str(item.get('price', '0')),
+                    'product_id': str(item.get('product_id') or key.split('_')[0]),
+                    'size': item.get('size'),
+                }
+            except (TypeError, ValueError):
+                continue
+    return lines
+
+
+def encode_cart(lines):
+    """
+    Compact, JSON-friendly session value for the in-memory line dict.
+    """
+    encoded = []
+    for item in lines.values():
+        product_id = item['product_id']
+        encoded.append([
+            int(product_id) if str(product_id).isdigit() else product_id,
+            item.get('size'),
+            int(item['quantity']),
+            _to_cents(item['price']),
+        ])
+    return {'v': CART_FORMAT_VERSION, 'l': encoded}
+
+
+def count_units(raw):
+    """
+    Units in a stored cart without building a Cart (used by the page cache).
+    """
+    return sum(item['quantity'] for item in decode_cart(raw).values())
+
+
+@dataclass
+class CartLine:
+    """
+    A valued cart line. Supports item['key'] so old templates and views keep working.
+    """
+    key: str
+    product: Any
+    size: Optional[str]
+    quantity: int
+    price: Decimal
+    stock: Optional[int] = None
+
+    @property
+    def product_id(self):
+        return str(self.product.id)
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+    @property
+    def in_stock(self):
+        return self.stock is None or self.quantity <= self.stock
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+
+@dataclass
+class CartSnapshot:
+    """
+    Lines, totals and stock problems of a cart, computed in one pass.
+    """
+    lines: List[CartLine] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.count = sum(line.quantity for line in self.lines)
+        self.total = sum((line.total_price for line in self.lines), Decimal('0'))
+        self.problems = [line for line in self.lines if not line.in_stock]
+
+    @property
+    def is_valid(self):
+        return not self.problems
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return self.count
+
+
 class Cart():
 
     def __init__(self, request):
         """
         Initialize the cart.
         """
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # save an empty cart in the session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        from . import store
+        self.customer_id = store.customer_id_for(request)
+        if self.customer_id is None:
+            # The cart is only stored in the session on the first save(), so
+            # merely reading an empty cart never marks the session modified
+            self.cart = decode_cart(self.session.get(settings.CART_SESSION_ID))
+        else:
+            # Logged-in customers keep their cart server-side (see cart/store.py)
+            self.cart = store.load(self.customer_id)
+            guest = decode_cart(self.session.get(settings.CART_SESSION_ID))
+            if guest:
+                self._merge(guest)
+                self.session.pop(settings.CART_SESSION_ID, None)
+                guest_hold = self.session.pop(CART_HOLD_SESSION_KEY, None)
+                if guest_hold:
+                    ledger.release(guest_hold)
+                # Keep every merged line; checkout flags whatever no longer fits
+                self.save(strict=False)
+
+    def holder(self, create=False):
+        """
+        Token under which this cart's stock reservations are held.
+        """
+        if self.customer_id is not None:
+            return f"customer:{self.customer_id}"
+        token = self.session.get(CART_HOLD_SESSION_KEY)
+        if token is None and create:
+            token = self.session[CART_HOLD_SESSION_KEY] = uuid.uuid4().hex
+        return token
+
+    def _merge(self, lines):
+        """
+        Fold the lines of a guest cart into this one.
+        """
+        for key, line in lines.items():
+            if key in self.cart:
+                self.cart[key]['quantity'] += line['quantity']
+            else:
+                self.cart[key] = line
 
-    def add(self, product, quantity=1, update_quantity=False, size=None, price=None):
+    def add(self, product, quantity=1, update_quantity=False, size=None, price=None, commit=True):
         """
         Add a product to the cart or update its quantity.
+        With commit=False the caller is expected to call save() once at the end.
         """
         product_id = str(product.id)
         # Use product_id + size as key to allow same product in different sizes
-        cart_key = f"{product_id}_{size}" if size else product_id
+        cart_key = _cart_key(product_id, size)
         
         if price is None:
-            price = product.price
+            # Always priced server-side (offer price when lower)
+            price = effective_price(product)
         
+        previous = dict(self.cart[cart_key]) if cart_key in self.cart else None
         if cart_key not in self.cart:
             self.cart[cart_key] = {
                 'quantity': 0,
@@ -38,54 +214,99 @@ class Cart():
             self.cart[cart_key]['quantity'] = quantity
         else:
             self.cart[cart_key]['quantity'] += quantity
-        self.save()
+        if commit:
+            try:
+                # Only growing a line can fail for lack of stock
+                self.save(strict=previous is None or self.cart[cart_key]['quantity'] > previous['quantity'])
+            except InsufficientStock:
+                if previous is None:
+                    del self.cart[cart_key]
+                else:
+                    self.cart[cart_key] = previous
+                raise
 
-    def save(self):
+    def save(self, strict=True):
         """
-        mark the session as "modified" to make sure it gets saved
+        store the cart and mark the session as "modified" to make sure it gets saved.
+        Stock for every line is reserved first; with strict=True raises
+        InsufficientStock (and stores nothing) if a line does not fit.
         """
+        ledger.reserve_cart(self.holder(create=True), [
+            (line['product_id'], line['size'], line['quantity']) for line in self.cart.values()
+        ], strict=strict)
+        if self.customer_id is not None:
+            from . import store
+            store.save(self.customer_id, self.cart)
+            return
+        self.session[settings.CART_SESSION_ID] = encode_cart(self.cart)
         self.session.modified = True
 
-    def remove(self, product, size=None):
+    def remove(self, product, size=None, commit=True):
         """
         Remove a product from the cart.
         """
         product_id = str(product.id) if hasattr(product, 'id') else str(product)
         # Use product_id + size as key to match add() format
-        cart_key = f"{product_id}_{size}" if size else product_id
+        cart_key = _cart_key(product_id, size)
         
         if cart_key in self.cart:
             del self.cart[cart_key]
-            self.save()
+            if commit:
+                self.save(strict=False)
             
     def clear(self):
         """
         Remove cart from session
         """
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.cart = {}
+        self.session.modified = True
+        holder = self.holder()
+        if holder:
+            ledger.release(holder)
+        if self.customer_id is not None:
+            from . import store
+            store.save(self.customer_id, self.cart)
+
+    def snapshot(self):
+        """
+        Value the cart with one query for products; stock comes from the in-memory ledger.
+        The result is memoised on the request until the cart changes.
+        """
+        state = tuple((key, line['quantity'], line['price']) for key, line in self.cart.items())
+        cached = getattr(self.request, '_cart_snapshot', None)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        product_ids = {line['product_id'] for line in self.cart.values()}
+        products = {str(p.id): p for p in Product.objects.filter(id__in=product_ids)} if product_ids else {}
+        holder = self.holder()
+
+        lines = []
+        for key, line in self.cart.items():
+            product = products.get(line['product_id'])
+            if product is None:
+                # Deleted products silently drop out of the cart
+                continue
+            # In-memory counter: stock not reserved by other carts (0 for a removed size)
+            available = ledger.available(product.id, line['size'], holder)
+            lines.append(CartLine(
+                key=key,
+                product=product,
+                size=line['size'],
+                quantity=line['quantity'],
+                price=Decimal(line['price']),
+                stock=available,
+            ))
+        snapshot = CartSnapshot(lines)
+        self.request._cart_snapshot = (state, snapshot)
+        return snapshot
 
     def __iter__(self):
         """
-        Iterate over the items in the cart and get the products
-        from the database.
+        Iterate over the valued lines of the cart (see snapshot()).
         """
-        product_ids = set()
-        for key in self.cart.keys():
-            # Extract product_id from key (format: "product_id" or "product_id_size")
-            product_id = key.split('_')[0]
-            product_ids.add(product_id)
-        
-        # get the product objects and add them to the cart
-        products = {str(p.id): p for p in Product.objects.filter(id__in=product_ids)}
-        
-        for key, item in self.cart.items():
-            product_id = item.get('product_id')
-            if product_id in products:
-                item['product'] = products[product_id]
-                item['price'] = Decimal(item['price'])
-                item['total_price'] = item['price'] * item['quantity']
-                yield item
+        return iter(self.snapshot())
 
     def __len__(self):
         """
@@ -97,14 +318,7 @@ class Cart():
         """
         calculate the total cost of the items in the cart
         """
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
-
-    def clear(self):
-        """
-        remove cart from session
-        """
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        return self.snapshot().total
 
     def get_total_price_after_discount(self):
         return self.get_total_price() - self.get_discount()
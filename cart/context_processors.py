@@ -1,4 +1,53 @@
+from django.utils.functional import SimpleLazyObject
+from django.utils.safestring import mark_safe
+
+from shop.cache import CART_BADGE_PLACEHOLDER
 from .cart import Cart
 
+
+class LazyCart:
+    """Proxy del carrito para las plantillas.
+
+    No construye el Cart (ni toca la sesión) hasta que una plantilla lo usa, y
+    memoriza ``len()`` y ``get_total_price()`` durante la petición.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._cart = None
+        self._len = None
+        self._total = None
+
+    def _get_cart(self):
+        if self._cart is None:
+            self._cart = Cart(self._request)
+        return self._cart
+
+    def __len__(self):
+        if self._len is None:
+            self._len = len(self._get_cart())
+        return self._len
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(self._get_cart())
+
+    def get_total_price(self):
+        if self._total is None:
+            self._total = self._get_cart().get_total_price()
+        return self._total
+
+    def __getattr__(self, name):
+        return getattr(self._get_cart(), name)
+
+
 def cart(request):
-    return {'cart': Cart(request)}
+    cart = LazyCart(request)
+    # En páginas cacheadas el contador se deja como hueco y se rellena al servirlas
+    if getattr(request, 'punch_holes', False):
+        badge = mark_safe(CART_BADGE_PLACEHOLDER)
+    else:
+        badge = SimpleLazyObject(lambda: len(cart))
+    return {'cart': cart, 'cart_badge': badge}
@@ -0,0 +1,223 @@
+"""Carritos persistentes en servidor para clientes identificados.
+
+La caché compartida es la fuente de verdad: cada guardado escribe en ella el
+carrito (formato compacto de ``cart.cart``) con una marca de tiempo y cada
+lectura empieza por ella, así que todos los workers ven el último carrito.
+Solo la escritura en ``Cart``/``CartItem`` va por lotes: cada guardado deja
+el carrito pendiente en el proceso y se vuelca todo junto al llegar a
+``CART_STORE_BATCH_SIZE`` carritos o pasados ``CART_STORE_FLUSH_INTERVAL``
+segundos. Al volcar se descarta lo pendiente si ya hay una versión más nueva
+(en la caché o, con el ORM, en ``Cart.updated``), de modo que un lote
+atrasado de otro worker nunca pisa un carrito más reciente. Funciona con
+MockDB (managers en memoria + fixtures JSON) y con el ORM.
+"""
+from __future__ import annotations
+
+import atexit
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cart import decode_cart, encode_cart
+
+CART_KEY_PREFIX = 'cart:customer'
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 30
+DEFAULT_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+_lock = threading.Lock()
+# customer_id -> (marca de tiempo, carrito codificado) pendiente de escribir en la base de datos
+_dirty: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+_last_flush = time.monotonic()
+_last_stamp = 0
+
+
+def customer_id_for(request) -> Optional[int]:
+    """Id del cliente identificado en la sesión (los administradores no tienen carrito propio)."""
+    session = getattr(request, 'session', None)
+    if session is None or session.get('mock_user_role') != 'customer':
+        return None
+    try:
+        return int(session.get('mock_user_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _key(customer_id: int) -> str:
+    return f"{CART_KEY_PREFIX}:{customer_id}"
+
+
+def _timeout() -> int:
+    return getattr(settings, 'CART_STORE_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def _stamp() -> int:
+    """Marca de tiempo en nanosegundos, creciente dentro del proceso."""
+    global _last_stamp
+    with _lock:
+        _last_stamp = max(time.time_ns(), _last_stamp + 1)
+        return _last_stamp
+
+
+def _cached(customer_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    entry = cache.get(_key(customer_id))
+    if isinstance(entry, dict) and 'cart' in entry:
+        return int(entry.get('ts', 0)), entry['cart']
+    return None
+
+
+def load(customer_id: int) -> Dict[str, Dict[str, Any]]:
+    """Líneas del carrito: de la caché compartida y, si no está, de la base de datos."""
+    entry = _cached(customer_id)
+    if entry is None:
+        stamp, raw = _load_from_db(customer_id)
+        # add: no pisar un guardado que haya llegado mientras leíamos
+        cache.add(_key(customer_id), {'ts': stamp, 'cart': raw}, _timeout())
+        entry = _cached(customer_id) or (stamp, raw)
+    return decode_cart(entry[1])
+
+
+def save(customer_id: int, lines: Dict[str, Dict[str, Any]]) -> None:
+    """Escribe el carrito en la caché y lo deja pendiente para el próximo volcado a la base de datos."""
+    raw = encode_cart(lines)
+    stamp = _stamp()
+    cache.set(_key(customer_id), {'ts': stamp, 'cart': raw}, _timeout())
+    with _lock:
+        _dirty[customer_id] = (stamp, raw)
+        due = (
+            len(_dirty) >= getattr(settings, 'CART_STORE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+            or time.monotonic() - _last_flush >= getattr(settings, 'CART_STORE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        )
+    if due:
+        flush()
+
+
+def flush() -> int:
+    """Escribe todos los carritos pendientes en un solo lote. Devuelve cuántos se escribieron."""
+    global _dirty, _last_flush
+    with _lock:
+        pending, _dirty = _dirty, {}
+        _last_flush = time.monotonic()
+    # Otro worker ya guardó una versión más nueva: que la escriba él
+    for customer_id in list(pending):
+        entry = _cached(customer_id)
+        if entry is not None and entry[0] > pending[customer_id][0]:
+            del pending[customer_id]
+    if not pending:
+        return 0
+    try:
+        _write_batch(pending)
+    except Exception as e:
+        print(f"[cart] ⚠️ No se pudieron guardar {len(pending)} carritos: {e}")
+        with _lock:
+            # Reencolar sin pisar cambios más recientes
+            for customer_id, entry in pending.items():
+                _dirty.setdefault(customer_id, entry)
+        return 0
+    return len(pending)
+
+
+def _load_from_db(customer_id: int) -> Tuple[int, Dict[str, Any]]:
+    """Carga el carrito con una sola consulta por id de cliente; devuelve (marca de tiempo, carrito)."""
+    from shop.catalog import effective_price
+    from .models import CartItem
+    mgr = CartItem.objects
+    stamp = 0
+    if hasattr(mgr, '_items'):
+        items = [
+            i for i in mgr.all()
+            if getattr(getattr(getattr(i, 'cart', None), 'customer', None), 'id', None) == customer_id
+        ]
+    else:
+        items = list(mgr.filter(cart__customer_id=customer_id).select_related('product', 'cart'))
+        if items:
+            stamp = _to_stamp(items[0].cart.updated)
+    lines = {}
+    for item in items:
+        size = item.size or None
+        key = f"{item.product.id}_{size}" if size else str(item.product.id)
+        lines[key] = {
+            'quantity': int(item.quantity),
+            'price': str(effective_price(item.product)),
+            'product_id': str(item.product.id),
+            'size': size,
+        }
+    return stamp, encode_cart(lines)
+
+
+def _to_stamp(when: Any) -> int:
+    return int(when.timestamp() * 1_000_000) * 1000 if when else 0
+
+
+def _from_stamp(stamp: int) -> Any:
+    from datetime import datetime, timezone as dt_timezone
+    return datetime.fromtimestamp(stamp / 1e9, tz=dt_timezone.utc)
+
+
+def _write_batch(pending: Dict[int, Tuple[int, Dict[str, Any]]]) -> None:
+    from .models import Cart as CartModel, CartItem
+    if hasattr(CartItem.objects, '_items'):
+        _write_batch_mock(pending)
+        return
+    from django.db import transaction
+    with transaction.atomic():
+        carts = {
+            c.customer_id: c
+            for c in CartModel.objects.select_for_update().filter(customer_id__in=list(pending))
+        }
+        # Una fila más nueva (guardada desde otro worker) gana al lote atrasado
+        pending = {
+            customer_id: entry for customer_id, entry in pending.items()
+            if customer_id not in carts or _to_stamp(carts[customer_id].updated) < entry[0]
+        }
+        if not pending:
+            return
+        for customer_id in pending:
+            if customer_id not in carts:
+                carts[customer_id] = CartModel.objects.create(customer_id=customer_id)
+        touched = [carts[customer_id] for customer_id in pending]
+        CartItem.objects.filter(cart_id__in=[c.id for c in touched]).delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart_id=carts[customer_id].id, product_id=int(line['product_id']),
+                     size=line['size'] or '', quantity=line['quantity'])
+            for customer_id, (_, raw) in pending.items()
+            for line in decode_cart(raw).values()
+        ])
+        # updated guarda la marca del guardado, no la hora del volcado
+        for customer_id, (stamp, _) in pending.items():
+            carts[customer_id].updated = _from_stamp(stamp)
+        CartModel.objects.bulk_update(touched, ['updated'])
+
+
+def _write_batch_mock(pending: Dict[int, Tuple[int, Dict[str, Any]]]) -> None:
+    from order.models import Customer
+    from shop.models import Product
+    from .models import Cart as CartModel, CartItem
+    customers = {c.id: c for c in Customer.objects.all()}
+    products = {p.id: p for p in Product.objects.all()}
+    carts = {c.customer.id: c for c in CartModel.objects.all() if getattr(c, 'customer', None) is not None}
+    for customer_id in pending:
+        if customer_id not in carts and customer_id in customers:
+            carts[customer_id] = CartModel.objects.create(customer=customers[customer_id])
+    touched = {carts[cid].id for cid in pending if cid in carts}
+    items = [i for i in CartItem.objects.all() if i.cart.id not in touched]
+    CartItem.objects.bulk_set(items)
+    for customer_id, (_, raw) in pending.items():
+        if customer_id not in carts:
+            continue
+        for line in decode_cart(raw).values():
+            product = products.get(int(line['product_id']))
+            if product is not None:
+                CartItem.objects.create(cart=carts[customer_id], product=product,
+                                        size=line['size'] or '', quantity=line['quantity'])
+    try:
+        from tests.mockdb.patcher import save_carts_to_fixture
+        save_carts_to_fixture()
+    except Exception as e:
+        print(f"[cart] ⚠️ No se pudieron persistir los carritos: {e}")
+
+
+atexit.register(flush)
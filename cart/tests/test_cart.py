@@ -0,0 +1,166 @@
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cart import store
+from cart.cart import CART_FORMAT_VERSION, Cart, decode_cart, encode_cart
+from cart.context_processors import cart as cart_context
+from shop.inventory import ledger
+from shop.models import Product, ProductSize
+
+
+class TestLazyCart(SimpleTestCase):
+
+    def setUp(self):
+        ledger.reset()
+        self.request = RequestFactory().get('/')
+        self.request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def test_unused_cart_leaves_session_untouched(self):
+        cart_context(self.request)
+        self.assertFalse(self.request.session.accessed)
+        self.assertFalse(self.request.session.modified)
+
+    def test_reading_an_empty_cart_does_not_modify_session(self):
+        context = cart_context(self.request)
+        self.assertEqual(str(context['cart_badge']), '0')
+        self.assertFalse(context['cart'])
+        self.assertFalse(self.request.session.modified)
+        self.assertNotIn(settings.CART_SESSION_ID, self.request.session)
+
+    def test_len_and_total_are_memoised(self):
+        Cart(self.request).add(SimpleNamespace(id=1, price=Decimal('10')), quantity=2, size='40')
+        proxy = cart_context(self.request)['cart']
+        self.assertEqual((len(proxy), proxy.get_total_price()), (2, Decimal('20')))
+        proxy._cart = None
+        self.assertEqual((len(proxy), proxy.get_total_price()), (2, Decimal('20')))
+        self.assertIsNone(proxy._cart)
+
+
+class TestCartEncoding(SimpleTestCase):
+
+    def setUp(self):
+        ledger.reset()
+        self.request = RequestFactory().get('/')
+        self.request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def test_session_stores_compact_lines(self):
+        cart = Cart(self.request)
+        cart.add(SimpleNamespace(id=7, price=Decimal('49.99')), quantity=2, size='41')
+        cart.add(SimpleNamespace(id=8, price=Decimal('10')))
+        self.assertEqual(self.request.session[settings.CART_SESSION_ID], {
+            'v': CART_FORMAT_VERSION,
+            'l': [[7, '41', 2, 4999], [8, None, 1, 1000]],
+        })
+        self.assertEqual(Cart(self.request).get_total_price(), Decimal('109.98'))
+
+    def test_legacy_format_is_upgraded_on_save(self):
+        self.request.session[settings.CART_SESSION_ID] = {
+            '7_41': {'quantity': 2, 'price': '49.99', 'product_id': '7', 'size': '41',
+                     'total_price': '99.98'},
+        }
+        cart = Cart(self.request)
+        self.assertEqual((len(cart), cart.get_total_price()), (2, Decimal('99.98')))
+        cart.remove(8)
+        cart.save()
+        self.assertEqual(self.request.session[settings.CART_SESSION_ID]['l'], [[7, '41', 2, 4999]])
+
+    def test_round_trip(self):
+        lines = decode_cart({'v': CART_FORMAT_VERSION, 'l': [[3, '40', 1, 1999], ['bad']]})
+        self.assertEqual(list(lines), ['3_40'])
+        self.assertEqual(encode_cart(lines), {'v': CART_FORMAT_VERSION, 'l': [[3, '40', 1, 1999]]})
+
+
+class TestCustomerCartStore(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        ledger.reset()
+        self.request = RequestFactory().get('/')
+        self.request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        self.request.session.update({'mock_user_role': 'customer', 'mock_user_id': 99})
+
+    @override_settings(CART_STORE_BATCH_SIZE=1000, CART_STORE_FLUSH_INTERVAL=3600)
+    def test_customer_cart_lives_in_cache_not_session(self):
+        with patch('cart.store._load_from_db', return_value=(0, {'v': CART_FORMAT_VERSION, 'l': []})) as db:
+            Cart(self.request).add(SimpleNamespace(id=7, price=Decimal('10')), quantity=3)
+            self.assertEqual(len(Cart(self.request)), 3)
+        self.assertEqual(db.call_count, 1)
+        self.assertNotIn(settings.CART_SESSION_ID, self.request.session)
+        self.assertIn(99, store._dirty)
+        store._dirty.clear()
+
+    @override_settings(CART_STORE_BATCH_SIZE=1000, CART_STORE_FLUSH_INTERVAL=3600)
+    def test_guest_cart_is_merged_on_login(self):
+        self.request.session[settings.CART_SESSION_ID] = {'v': CART_FORMAT_VERSION, 'l': [[7, None, 1, 1000]]}
+        stored = {'v': CART_FORMAT_VERSION, 'l': [[7, None, 2, 1000], [8, '40', 1, 500]]}
+        with patch('cart.store._load_from_db', return_value=(0, stored)):
+            cart = Cart(self.request)
+        self.assertEqual(len(cart), 4)
+        self.assertNotIn(settings.CART_SESSION_ID, self.request.session)
+        store._dirty.clear()
+
+    @override_settings(CART_STORE_BATCH_SIZE=2, CART_STORE_FLUSH_INTERVAL=3600)
+    def test_writes_are_batched(self):
+        with patch('cart.store._write_batch') as write:
+            store.save(1, {})
+            self.assertFalse(write.called)
+            store.save(2, {})
+        write.assert_called_once()
+        self.assertEqual(set(write.call_args[0][0]), {1, 2})
+        self.assertEqual(store._dirty, {})
+
+    @override_settings(CART_STORE_BATCH_SIZE=1000, CART_STORE_FLUSH_INTERVAL=3600)
+    def test_other_workers_see_the_latest_cart_and_old_buffers_are_dropped(self):
+        self.addCleanup(store._dirty.clear)
+        store.save(99, {'7': {'quantity': 1, 'price': '10', 'product_id': '7', 'size': None}})
+        # Otro worker guarda después un carrito distinto en la caché compartida
+        newer = {'7': {'quantity': 5, 'price': '10', 'product_id': '7', 'size': None}}
+        cache.set(store._key(99), {'ts': store._dirty[99][0] + 1, 'cart': encode_cart(newer)})
+        self.assertEqual(store.load(99)['7']['quantity'], 5)
+        with patch('cart.store._write_batch') as write:
+            self.assertEqual(store.flush(), 0)
+        write.assert_not_called()
+
+
+class TestCartSnapshot(SimpleTestCase):
+
+    def setUp(self):
+        ledger.reset()
+        self.size = next(s for s in ProductSize.objects.all() if s.stock > 0)
+        self.product = self.size.product
+        self.request = self.new_request()
+
+    def new_request(self):
+        request = RequestFactory().get('/')
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        return request
+
+    def test_lines_are_valued_and_checked_against_stock(self):
+        cart = Cart(self.request)
+        cart.add(self.product, quantity=2, size=self.size.size, price=Decimal('10'))
+        line = cart.snapshot().lines[0]
+        self.assertEqual((line.stock, line['total_price']), (self.size.stock, Decimal('20')))
+        self.assertTrue(cart.snapshot().is_valid)
+
+        # Another buyer reserves everything: the unreserved session line no longer fits
+        ledger.release(cart.holder())
+        Cart(self.new_request()).add(self.product, quantity=self.size.stock, size=self.size.size)
+        self.request._cart_snapshot = None
+        snapshot = Cart(self.request).snapshot()
+        self.assertEqual(snapshot.lines[0].stock, 0)
+        self.assertFalse(snapshot.is_valid)
+
+    def test_snapshot_is_memoised_per_request(self):
+        Cart(self.request).add(self.product, size=self.size.size, price=Decimal('10'))
+        with patch.object(Product.objects, 'filter', wraps=Product.objects.filter) as query:
+            first = Cart(self.request).snapshot()
+            list(Cart(self.request))
+            Cart(self.request).get_total_price()
+        self.assertEqual(query.call_count, 1)
+        self.assertIs(Cart(self.request).snapshot(), first)
@@ -0,0 +1,70 @@
+import json
+
+from django.test import Client, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from shop.catalog import effective_price
+from shop.inventory import ledger
+from shop.models import Product, ProductSize
+
+
+# Sin USE_MOCKDB=1 las sesiones irían a la base de datos (motor dummy)
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class TestCartBatch(SimpleTestCase):
+
+    def setUp(self):
+        ledger.reset()
+        self.client = Client()
+        self.first, self.second = list(Product.objects.all())[:2]
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart:cart_batch'), json.dumps({'operations': list(operations)}),
+                                content_type='application/json')
+
+    def test_applies_operations_and_returns_totals(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.first.id, 'size': '41', 'quantity': 2},
+            {'op': 'add', 'product_id': self.second.id, 'size': '40'},
+            {'op': 'update', 'product_id': self.first.id, 'size': '41', 'quantity': 3},
+            {'op': 'remove', 'product_id': self.second.id, 'size': '40'},
+        )
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['cart_count'], 3)
+        self.assertEqual(data['lines'], [{'product_id': str(self.first.id), 'size': '41', 'quantity': 3}])
+
+    def test_invalid_batch_changes_nothing(self):
+        self.batch({'op': 'add', 'product_id': self.first.id, 'size': '41'})
+        response = self.batch(
+            {'op': 'remove', 'product_id': self.first.id, 'size': '41'},
+            {'op': 'add', 'product_id': 999999},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.batch().json()['cart_count'], 1)
+
+    def test_rejects_malformed_body(self):
+        response = self.client.post(reverse('cart:cart_batch'), 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_sent_price_is_ignored(self):
+        for price in ('0.01', 'abc'):
+            response = self.batch({'op': 'update', 'product_id': self.first.id, 'size': '41', 'quantity': 1, 'price': price})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['cart_total'], str(effective_price(self.first)))
+        self.client.post(reverse('cart:cart_add', args=[self.second.id]), {'quantity': 1, 'size': '40', 'price': '0.01'})
+        self.assertEqual(self.batch().json()['cart_total'], str(effective_price(self.first) + effective_price(self.second)))
+
+    def test_shrinking_batch_never_blocked_by_stock(self):
+        size = next(s for s in ProductSize.objects.all() if s.stock > 1)
+        line = {'product_id': size.product.id, 'size': size.size}
+        self.batch(dict(line, op='add', quantity=2))
+        # La reserva caducó y otro carrito se quedó con todas las unidades
+        ledger.reset()
+        ledger.reserve_cart('other', [(size.product.id, size.size, size.stock)])
+        self.assertEqual(self.batch(dict(line, op='add', quantity=1)).status_code, 409)
+        response = self.batch(dict(line, op='update', quantity=1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_count'], 1)
+        response = self.batch(dict(line, op='remove'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_count'], 0)
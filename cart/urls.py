@@ -9,4 +9,5 @@ urlpatterns = [
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('update/<int:product_id>/', views.cart_update_quantity, name='cart_update_quantity'),
     path('clear/', views.cart_clear, name='cart_clear'),
+    path('batch/', views.cart_batch, name='cart_batch'),
 ]
\ No newline at end of file
@@ -1,10 +1,37 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
+from shop.inventory import InsufficientStock
 from shop.models import Product
 from .cart import Cart
 from .forms import CartAddProductForm
 from django.http import JsonResponse
 
+BATCH_OPERATIONS = ('add', 'update', 'remove')
+MAX_BATCH_OPERATIONS = 100
+
+
+def _cart_json(cart, **extra):
+    data = {
+        'success': True,
+        'cart_count': len(cart),
+        'cart_total': str(cart.get_total_price()),
+    }
+    data.update(extra)
+    return JsonResponse(data)
+
+
+def _out_of_stock(request, cart, error):
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.content_type == 'application/json':
+        return JsonResponse({
+            'success': False,
+            'errors': [str(error)],
+            'cart_count': len(cart),
+            'cart_total': str(cart.get_total_price()),
+        }, status=409)
+    return redirect('cart:cart_detail')
+
 @require_POST
 def cart_add(request, product_id):
     cart = Cart(request)
@@ -14,16 +41,14 @@ def cart_add(request, product_id):
     if form.is_valid():
         cd = form.cleaned_data
         size = cd.get('size') or request.POST.get('size')
-        price = request.POST.get('price') or product.price
-        cart.add(product=product, quantity=cd['quantity'], 
-                update_quantity=cd['update'], size=size, price=price)
+        try:
+            cart.add(product=product, quantity=cd['quantity'],
+                     update_quantity=cd['update'], size=size)
+        except InsufficientStock as e:
+            return _out_of_stock(request, cart, e)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_count': len(cart),
-            'cart_total': str(cart.get_total_price())
-        })
+        return _cart_json(cart)
     
     return redirect('cart:cart_detail')
 
@@ -39,14 +64,13 @@ def cart_update_quantity(request, product_id):
         quantity = 1
     
     product = get_object_or_404(Product.objects, id=product_id)
-    cart.add(product=product, quantity=quantity, update_quantity=True, size=size)
+    try:
+        cart.add(product=product, quantity=quantity, update_quantity=True, size=size)
+    except InsufficientStock as e:
+        return _out_of_stock(request, cart, e)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_count': len(cart),
-            'cart_total': str(cart.get_total_price())
-        })
+        return _cart_json(cart)
     
     return redirect('cart:cart_detail')
 
@@ -55,24 +79,89 @@ def cart_remove(request, product_id):
     size = request.POST.get('size')
     cart.remove(product_id, size=size)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_count': len(cart),
-            'cart_total': str(cart.get_total_price())
-        })
+        return _cart_json(cart)
     return redirect('cart:cart_detail')
 
 def cart_clear(request):
     cart = Cart(request)
     cart.clear()
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_count': len(cart),
-            'cart_total': str(cart.get_total_price())
-        })
+        return _cart_json(cart)
     return redirect('cart:cart_detail')
 
 def cart_detail(request):
     cart = Cart(request)
-    return render(request, 'cart/detail.html', {'cart': cart})
\ No newline at end of file
+    return render(request, 'cart/detail.html', {'cart': cart})
+
+
+def _parse_operation(raw):
+    """Valida una operación del lote; devuelve (operación, error)."""
+    if not isinstance(raw, dict) or raw.get('op') not in BATCH_OPERATIONS:
+        return None, 'Operación no válida'
+    try:
+        op = {
+            'op': raw['op'],
+            'product_id': int(raw.get('product_id')),
+            'size': raw.get('size') or None,
+            'quantity': int(raw.get('quantity', 1)),
+        }
+    except (TypeError, ValueError):
+        return None, 'product_id y quantity deben ser números'
+    if op['op'] == 'add' and op['quantity'] < 1:
+        return None, 'La cantidad debe ser al menos 1'
+    # Igual que cart_update_quantity: nunca por debajo de 1
+    op['quantity'] = max(op['quantity'], 1)
+    return op, None
+
+
+@require_POST
+def cart_batch(request):
+    """Aplica varias operaciones add/update/remove en una sola petición JSON.
+
+    Cuerpo: ``{"operations": [{"op": "update", "product_id": 3, "size": "41", "quantity": 2}, ...]}``.
+    Si alguna operación no es válida no se aplica ninguna (respuesta 400).
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        raw_ops = payload.get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'errors': ['JSON no válido']}, status=400)
+    if not isinstance(raw_ops, list) or len(raw_ops) > MAX_BATCH_OPERATIONS:
+        return JsonResponse({'success': False, 'errors': [f'Se esperaba una lista de hasta {MAX_BATCH_OPERATIONS} operaciones']}, status=400)
+
+    operations, errors = [], []
+    for i, raw in enumerate(raw_ops):
+        op, error = _parse_operation(raw)
+        if error:
+            errors.append(f'#{i}: {error}')
+        else:
+            operations.append(op)
+
+    # Una sola consulta para todos los productos que se añaden o actualizan
+    wanted = {op['product_id'] for op in operations if op['op'] != 'remove'}
+    products = {p.id: p for p in Product.objects.filter(id__in=wanted)} if wanted else {}
+    for op in operations:
+        if op['op'] != 'remove' and op['product_id'] not in products:
+            errors.append(f"Producto {op['product_id']} no encontrado")
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+
+    cart = Cart(request)
+    before = {key: line['quantity'] for key, line in cart.cart.items()}
+    for op in operations:
+        if op['op'] == 'remove':
+            cart.remove(op['product_id'], size=op['size'], commit=False)
+        else:
+            product = products[op['product_id']]
+            cart.add(product=product, quantity=op['quantity'], update_quantity=op['op'] == 'update',
+                     size=op['size'], commit=False)
+    # Como Cart.add: solo se exige stock si alguna línea crece; quitar o bajar nunca falla
+    grew = any(line['quantity'] > before.get(key, 0) for key, line in cart.cart.items())
+    try:
+        cart.save(strict=grew)
+    except InsufficientStock as e:
+        return JsonResponse({'success': False, 'errors': [str(e)]}, status=409)
+    return _cart_json(cart, lines=[
+        {'product_id': line['product_id'], 'size': line['size'], 'quantity': line['quantity']}
+        for line in cart.cart.values()
+    ])
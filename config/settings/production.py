@@ -129,3 +129,55 @@ MEDIA_URL = '/media/'
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 CART_SESSION_ID = 'cart'
+
+# Carritos de clientes identificados: caché + escritura por lotes (cart/store.py)
+CART_STORE_BATCH_SIZE = 50
+CART_STORE_FLUSH_INTERVAL = 30
+
+# Reservas de stock de los carritos (shop/inventory.py), en segundos
+STOCK_RESERVATION_TTL = 15 * 60
+STOCK_SWEEP_INTERVAL = 60
+
+# Claves de idempotencia del checkout (order/idempotency.py), en segundos
+ORDER_IDEMPOTENCY_TTL = 60 * 60
+
+# Numeración de pedidos: cada proceso reserva bloques de números (order/sequence.py)
+ORDER_NUMBER_PREFIX = 'MOCK'
+ORDER_NUMBER_BLOCK_SIZE = 20
+
+# Bandeja de salida de correos (order/outbox.py): hilo de envío, reintentos y espera en segundos
+ORDER_OUTBOX_BACKGROUND = True
+ORDER_OUTBOX_POLL_INTERVAL = 10
+ORDER_OUTBOX_MAX_ATTEMPTS = 5
+ORDER_OUTBOX_RETRY_DELAY = 30
+
+# Conexiones SMTP reutilizables (order/mail.py): conexiones abiertas, mensajes por lote, segundos ociosa
+ORDER_MAIL_POOL_SIZE = 2
+ORDER_MAIL_BATCH_SIZE = 50
+ORDER_MAIL_IDLE_TIMEOUT = 60
+
+# Tarifas de envío en memoria (order/shipping.py): segundos entre comprobaciones del fichero
+SHIPPING_CONFIG_CHECK_INTERVAL = 1.0
+
+# Presupuestos de envío del checkout cacheados por sesión (order/quotes.py), en segundos
+ORDER_SHIPPING_QUOTE_TTL = 5 * 60
+
+# Token de cliente de Braintree (order/payments.py): validez en caché y espera máxima del navegador, en segundos
+BRAINTREE_CLIENT_TOKEN_TTL = 60 * 60
+BRAINTREE_CLIENT_TOKEN_WAIT = 10
+
+# Pasarela de pago (order/payments.py): en producción siempre Braintree; la 'fake' solo con DEBUG
+PAYMENT_GATEWAY = 'braintree'
+
+# Catálogo: productos por página en los listados (paginación por clave)
+SHOP_PAGE_SIZE = 12
+
+# Caché de páginas del catálogo (se invalida por versión, ver shop/cache.py).
+# Basada en ficheros para que todos los workers de gunicorn compartan la versión.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+    }
+}
+SHOP_PAGE_CACHE_TIMEOUT = 60 * 15
@@ -0,0 +1,120 @@
+"""Documentos de un pedido: correo HTML, correo en texto y ticket descargable.
+
+``load``/``load_many`` leen el pedido con sus líneas y productos una sola vez
+(una consulta para todo el lote) y ``OrderDocument`` genera los tres
+documentos a partir del mismo contexto. Las plantillas se compilan una vez
+por proceso.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+from django.utils.functional import cached_property
+
+from .models import OrderItem
+
+HTML_TEMPLATE = 'emails/confirmation.html'
+TEXT_TEMPLATE = 'emails/confirmation.txt'
+TICKET_TEMPLATE = 'emails/ticket.txt'
+
+PAYMENT_LABELS = {
+    'card': 'Tarjeta',
+    'cod': 'Contrareembolso',
+    'gateway': 'Pasarela de pago',
+}
+SHIPPING_LABELS = {
+    'home': 'Envio a domicilio',
+    'store': 'Recogida en tienda',
+}
+
+
+@lru_cache(maxsize=None)
+def _template(name: str):
+    return get_template(name)
+
+
+def _created_display(created: Any) -> str:
+    if not created:
+        return ''
+    if hasattr(created, 'strftime'):
+        return created.strftime('%d/%m/%Y %H:%M')
+    return str(created)
+
+
+class OrderDocument:
+    """Pedido con sus líneas ya cargadas; cada documento se renderiza una sola vez."""
+
+    def __init__(self, order: Any, items: List[Any]):
+        self.order = order
+        self.items = items
+
+    @cached_property
+    def context(self) -> Dict[str, Any]:
+        order = self.order
+        payment_method = getattr(order, 'payment_method', '') or 'N/A'
+        shipping_method = getattr(order, 'shipping_method', '') or 'N/A'
+        return {
+            'order': order,
+            'items': self.items,
+            'order_number': getattr(order, 'order_number', '') or f'#{order.id}',
+            'customer_name': f"{getattr(order, 'first_name', '')} {getattr(order, 'last_name', '')}",
+            'created': _created_display(getattr(order, 'created', None)),
+            'subtotal': getattr(order, 'subtotal', 0),
+            'shipping_cost': getattr(order, 'shipping_cost', 0),
+            'total': getattr(order, 'total', 0),
+            'payment_display': PAYMENT_LABELS.get(payment_method, payment_method),
+            'shipping_display': SHIPPING_LABELS.get(shipping_method, shipping_method),
+        }
+
+    @cached_property
+    def html(self) -> str:
+        return _template(HTML_TEMPLATE).render(self.context)
+
+    @cached_property
+    def text(self) -> str:
+        return _template(TEXT_TEMPLATE).render(self.context)
+
+    @cached_property
+    def ticket(self) -> str:
+        return _template(TICKET_TEMPLATE).render(self.context)
+
+    def confirmation_message(self) -> EmailMultiAlternatives:
+        """Correo de confirmación (texto + HTML) listo para enviar."""
+        message = EmailMultiAlternatives(
+            subject=f"Confirmación de Pedido #{self.context['order_number']} - Nexo Shoes",
+            body=self.text,
+            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@nexoshoes.com'),
+            to=[self.order.email],
+        )
+        message.attach_alternative(self.html, 'text/html')
+        return message
+
+
+def _items_by_order(order_ids: List[int]) -> Dict[int, List[Any]]:
+    """Líneas de varios pedidos en una sola consulta (con su producto)."""
+    mgr = OrderItem.objects
+    wanted = set(order_ids)
+    by_order: Dict[int, List[Any]] = {oid: [] for oid in order_ids}
+    if hasattr(mgr, '_items'):
+        items = [i for i in mgr.all() if getattr(getattr(i, 'order', None), 'id', None) in wanted]
+    else:
+        items = mgr.filter(order_id__in=order_ids).select_related('product').order_by('id')
+    for item in items:
+        # order_id evita que el ORM cargue el pedido de cada línea
+        by_order[getattr(item, 'order_id', None) or item.order.id].append(item)
+    return by_order
+
+
+def load_many(orders: Iterable[Any]) -> Dict[int, OrderDocument]:
+    """Documentos de varios pedidos, por id de pedido."""
+    orders = list(orders)
+    items = _items_by_order([o.id for o in orders])
+    return {o.id: OrderDocument(o, items[o.id]) for o in orders}
+
+
+def load(order: Any) -> OrderDocument:
+    return load_many([order])[order.id]
@@ -3,6 +3,9 @@ from .models import Order
 from .shipping import method_choices
 
 class OrderCreateForm(forms.ModelForm):
+    # Clave de idempotencia del envío (ver order/idempotency.py)
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=64)
+
     class Meta:
         model = Order
         fields = [
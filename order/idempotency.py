@@ -0,0 +1,101 @@
+"""Claves de idempotencia del checkout.
+
+Cada formulario de pedido lleva una clave aleatoria. El primer envío la
+reclama y, al crear el pedido, guarda con ella la URL a la que se redirigió.
+Los envíos repetidos (doble clic, reintentos del navegador) reciben esa misma
+redirección sin volver a crear el pedido; si llegan mientras el primero sigue
+en curso, esperan a que acabe.
+
+Con el ORM la reclamación es una fila ``IdempotencyKey``: la restricción
+``unique`` de la clave decide qué petición gana, también entre procesos y con
+cachés como FileBasedCache cuyo ``add`` no es atómico. Con MockDB (un único
+proceso de desarrollo) basta ``cache.add`` sobre la caché en memoria.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import IdempotencyKey, Order
+
+KEY_PREFIX = 'order:idempotency'
+PENDING = '__pending__'
+DEFAULT_TTL = 60 * 60
+# Tiempo máximo que una clave puede quedar reclamada sin resultado (petición caída)
+PENDING_TTL = 60
+POLL_INTERVAL = 0.1
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+def _ttl() -> int:
+    return getattr(settings, 'ORDER_IDEMPOTENCY_TTL', DEFAULT_TTL)
+
+
+def _is_mock() -> bool:
+    return hasattr(Order.objects, '_items')
+
+
+def _key(key: str) -> str:
+    return f"{KEY_PREFIX}:{key}"
+
+
+def claim(key: str) -> bool:
+    """True si esta petición es la primera con la clave y debe crear el pedido."""
+    if _is_mock():
+        return cache.add(_key(key), PENDING, PENDING_TTL)
+    now = timezone.now()
+    # Claves caducadas y reclamaciones de peticiones caídas
+    IdempotencyKey.objects.filter(
+        Q(created__lt=now - timedelta(seconds=_ttl()))
+        | Q(redirect_url='', created__lt=now - timedelta(seconds=PENDING_TTL))
+    ).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=key)
+    except IntegrityError:
+        return False
+    return True
+
+
+def complete(key: str, redirect_url: str) -> None:
+    """Guarda la redirección del pedido creado para los envíos repetidos."""
+    if _is_mock():
+        cache.set(_key(key), redirect_url, _ttl())
+    else:
+        IdempotencyKey.objects.filter(key=key).update(redirect_url=redirect_url)
+
+
+def release(key: str) -> None:
+    """Libera la clave de un intento que no llegó a crear el pedido."""
+    if _is_mock():
+        cache.delete(_key(key))
+    else:
+        IdempotencyKey.objects.filter(key=key, redirect_url='').delete()
+
+
+def _value(key: str) -> Optional[str]:
+    if _is_mock():
+        return cache.get(_key(key))
+    url = IdempotencyKey.objects.filter(key=key).values_list('redirect_url', flat=True).first()
+    return PENDING if url == '' else url
+
+
+def result(key: str, wait: float = 5.0) -> Optional[str]:
+    """Redirección del pedido ya creado con la clave, esperando si aún está en curso."""
+    deadline = time.monotonic() + wait
+    while True:
+        value = _value(key)
+        if value != PENDING or time.monotonic() >= deadline:
+            return None if value in (None, PENDING) else value
+        time.sleep(POLL_INTERVAL)
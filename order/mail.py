@@ -0,0 +1,172 @@
+"""Transporte de correo con conexiones SMTP reutilizables.
+
+Cada envío abría antes su propia conexión (TCP + STARTTLS + login). Aquí se
+mantiene un pequeño pool de backends de Django ya abiertos y autenticados;
+``send_batch`` toma uno y envía por él todos los mensajes del lote. Las
+conexiones que llevan demasiado tiempo ociosas se cierran antes de
+reutilizarlas y, si el servidor corta a mitad de lote, se reconecta y se
+reintenta el mensaje una vez.
+
+Funciona con cualquier ``EMAIL_BACKEND`` (consola y locmem incluidos); con el
+backend SMTP de Django se usa ``SMTPBackend``, que hace STARTTLS con un
+contexto SSL (el backend de Django 3.1 falla en Python 3.12+ por ``keyfile``).
+"""
+from __future__ import annotations
+
+import smtplib
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, List, Optional
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends import smtp
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_IDLE_TIMEOUT = 60
+
+# Errores tras los que la conexión ya no sirve y hay que abrir otra
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class SMTPBackend(smtp.EmailBackend):
+    """Backend SMTP de Django con STARTTLS compatible con Python 3.12+."""
+
+    def open(self):
+        if self.connection:
+            return False
+        connection_params = {'local_hostname': smtp.DNS_NAME.get_fqdn()}
+        if self.timeout is not None:
+            connection_params['timeout'] = self.timeout
+        context = ssl.create_default_context()
+        if self.ssl_certfile:
+            context.load_cert_chain(self.ssl_certfile, self.ssl_keyfile)
+        if self.use_ssl:
+            connection_params['context'] = context
+        try:
+            self.connection = self.connection_class(self.host, self.port, **connection_params)
+            if not self.use_ssl and self.use_tls:
+                self.connection.starttls(context=context)
+            if self.username and self.password:
+                self.connection.login(self.username, self.password)
+            return True
+        except OSError:
+            if not self.fail_silently:
+                raise
+
+
+def _new_backend():
+    backend = getattr(settings, 'EMAIL_BACKEND', '')
+    if backend == 'django.core.mail.backends.smtp.EmailBackend':
+        backend = 'order.mail.SMTPBackend'
+    connection = get_connection(backend, fail_silently=False)
+    connection.open()
+    return connection
+
+
+class ConnectionPool:
+    """Backends de correo abiertos, reutilizados entre lotes."""
+
+    def __init__(self, size: int = None):
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List[Any] = []  # [(backend, última vez usado)]
+        self.opened = 0
+
+    def _timeout(self) -> float:
+        return getattr(settings, 'ORDER_MAIL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                backend, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self._timeout():
+                    return backend
+                _close(backend)
+            self.opened += 1
+        return _new_backend()
+
+    def _release(self, backend) -> None:
+        size = self.size or getattr(settings, 'ORDER_MAIL_POOL_SIZE', DEFAULT_POOL_SIZE)
+        with self._lock:
+            if len(self._idle) < size:
+                self._idle.append((backend, time.monotonic()))
+                return
+        _close(backend)
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión abierta; vuelve al pool al salir (o se cierra si hubo error)."""
+        lease = _Lease(self, self._acquire())
+        try:
+            yield lease
+        except BaseException:
+            _close(lease.backend)
+            raise
+        self._release(lease.backend)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for backend, _ in idle:
+            _close(backend)
+
+
+class _Lease:
+    """Conexión prestada por el pool; se sustituye por otra si el servidor la corta."""
+
+    def __init__(self, pool: ConnectionPool, backend):
+        self.pool = pool
+        self.backend = backend
+
+    def send(self, message: Any) -> Optional[Exception]:
+        for attempt in range(2):
+            try:
+                self.backend.send_messages([message])
+                return None
+            except CONNECTION_ERRORS as e:
+                if attempt:
+                    return e
+                _close(self.backend)
+                with self.pool._lock:
+                    self.pool.opened += 1
+                try:
+                    self.backend = _new_backend()
+                except Exception as reconnect_error:
+                    return reconnect_error
+            except Exception as e:
+                # Rechazo de este mensaje (destinatario inválido...): la conexión sigue sirviendo
+                return e
+        return None
+
+
+def _close(backend) -> None:
+    try:
+        backend.close()
+    except Exception:
+        pass
+
+
+def send_batch(messages: List[Any]) -> List[Optional[Exception]]:
+    """Envía los mensajes reutilizando conexiones del pool.
+
+    Devuelve, para cada mensaje, None si se envió o la excepción del fallo.
+    """
+    results: List[Optional[Exception]] = []
+    batch_size = getattr(settings, 'ORDER_MAIL_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    for start in range(0, len(messages), batch_size):
+        chunk = messages[start:start + batch_size]
+        done = len(results)
+        try:
+            with pool.connection() as lease:
+                results.extend(lease.send(message) for message in chunk)
+        except Exception as e:
+            # No se pudo ni conectar: el resto del lote queda pendiente con este error
+            results.extend([e] * (done + len(chunk) - len(results)))
+    return results
+
+
+pool = ConnectionPool()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from order import totals
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el subtotal y el total de los pedidos a partir de sus líneas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Corregir los pedidos descuadrados')
+
+    def handle(self, *args, **options):
+        mismatches = totals.audit(fix=options['fix'])
+        for mismatch in mismatches:
+            self.stdout.write(str(mismatch))
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Todos los pedidos cuadran con sus líneas'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'{len(mismatches)} pedidos corregidos'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} pedidos descuadrados (usa --fix para corregirlos)'))
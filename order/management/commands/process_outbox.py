@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order import outbox
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la bandeja de salida de pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Seguir vaciando la bandeja cada --interval segundos')
+        parser.add_argument('--interval', type=float, default=outbox.DEFAULT_POLL_INTERVAL)
+        parser.add_argument('--limit', type=int, default=None, help='Máximo de correos por pasada')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = outbox.drain(options['limit'])
+            if sent:
+                self.stdout.write(self.style.SUCCESS(f'{sent} correos enviados'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,8 +1,7 @@
 from django.db import models
 from shop.models import Product
 from accounts.models import UserAccount
-from decimal import Decimal
-from .shipping import compute_shipping, method_choices
+from .shipping import method_choices
 
 class Customer(UserAccount):
     """Cliente del ecommerce que hereda de UserAccount.
@@ -71,16 +70,41 @@ class Order(models.Model):
         return 'Order {}'.format(self.id)
 
     def get_total_cost(self):
-        return sum(item.get_cost() for item in self.items.all())
+        """Amount to pay, stored when the order is created (see order/totals.py)"""
+        return self.total
     
     def get_shipping_cost(self):
-        """Calculate shipping cost based on method and total"""
-        subtotal = sum(item.get_cost() for item in self.items.all())
-        return Decimal(str(compute_shipping(float(subtotal), self.shipping_method)))
+        return self.shipping_cost
     
+    @classmethod
+    def payment_required_for(cls, shipping_method, payment_method):
+        """Payment is required unless the order is picked up in store or paid on delivery"""
+        return shipping_method != 'store' and payment_method != cls.CASH_ON_DELIVERY
+
     def is_payment_required(self):
         """Check if payment is required (not pickup and not cash on delivery)"""
-        return self.shipping_method != 'store' and self.payment_method != self.CASH_ON_DELIVERY
+        return self.payment_required_for(self.shipping_method, self.payment_method)
+
+class OrderSequence(models.Model):
+    """Último número reservado de una secuencia (ver order/sequence.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+class IdempotencyKey(models.Model):
+    """Envío del checkout ya reclamado (ver order/idempotency.py)"""
+    key = models.CharField(max_length=64, unique=True)
+    # Vacía mientras el pedido se está creando
+    redirect_url = models.CharField(max_length=200, blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created'])]
+
+    def __str__(self):
+        return self.key
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
@@ -98,5 +122,33 @@ class OrderItem(models.Model):
         return '{}'.format(self.id)
 
     def get_cost(self):
-        # Mantener comportamiento antiguo; line_total puede calcularse externamente
-        return self.price * self.quantity
+        # line_total se guarda al crear el pedido; las líneas antiguas no lo tienen
+        return self.line_total or self.price * self.quantity
+
+
+class EmailOutbox(models.Model):
+    """Correo pendiente de enviar para un pedido (ver order/outbox.py)"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendiente'),
+        (SENT, 'Enviado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='emails', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=30, default='confirmation')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=500, blank=True, default='')
+    next_attempt_at = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('order', 'kind')
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.kind} #{self.order_id} ({self.status})'
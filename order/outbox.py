@@ -0,0 +1,176 @@
+"""Bandeja de salida de los correos de pedidos.
+
+La página de confirmación solo apunta el correo en ``EmailOutbox`` (una fila
+por pedido y tipo, así que recargarla no duplica envíos) y responde sin
+esperar al servidor SMTP. Un hilo en segundo plano del propio proceso
+(``ORDER_OUTBOX_BACKGROUND``) o el comando ``manage.py process_outbox`` vacían
+la bandeja con reintentos y espera exponencial; cada pasada sale en lote por
+conexiones SMTP reutilizadas (ver order/mail.py). Con MockDB la bandeja se
+guarda en ``tests/mockdb/data/email_outbox.json``.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
+
+from . import mail
+from .documents import OrderDocument, load_many
+from .models import EmailOutbox
+
+CONFIRMATION = 'confirmation'
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 30
+DEFAULT_POLL_INTERVAL = 10
+# Mientras un envío está en curso la fila queda apartada este tiempo
+CLAIM_LEASE = 5 * 60
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+
+def _is_mock() -> bool:
+    return hasattr(EmailOutbox.objects, '_items')
+
+
+def _persist_mock() -> None:
+    try:
+        from tests.mockdb.patcher import save_email_outbox_to_fixture
+        save_email_outbox_to_fixture()
+    except Exception as e:
+        print(f"[outbox] ⚠️ No se pudo persistir la bandeja de salida: {e}")
+
+
+BUILDERS: Dict[str, Callable[[OrderDocument], EmailMultiAlternatives]] = {
+    CONFIRMATION: OrderDocument.confirmation_message,
+}
+
+
+def enqueue(order: Any, kind: str = CONFIRMATION) -> bool:
+    """Apunta el correo del pedido si aún no lo estaba. Devuelve True si es nuevo."""
+    fields = dict(status=EmailOutbox.PENDING, attempts=0, last_error='',
+                  next_attempt_at=timezone.now(), sent_at=None)
+    if _is_mock():
+        with _lock:
+            created = not any(
+                e.kind == kind and getattr(e.order, 'id', None) == order.id for e in EmailOutbox.objects.all()
+            )
+            if created:
+                EmailOutbox.objects.create(order=order, kind=kind, **fields)
+        if created:
+            _persist_mock()
+    else:
+        # unique_together(order, kind) resuelve dos peticiones simultáneas
+        _, created = EmailOutbox.objects.get_or_create(order=order, kind=kind, defaults=fields)
+    if created:
+        wake()
+    return created
+
+
+def enqueue_confirmation(order: Any) -> bool:
+    return enqueue(order, CONFIRMATION)
+
+
+def _claim_due(limit: Optional[int]) -> List[Any]:
+    """Aparta los correos pendientes cuyo turno ha llegado para que nadie más los envíe."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=CLAIM_LEASE)
+    if _is_mock():
+        with _lock:
+            due = [e for e in EmailOutbox.objects.all()
+                   if e.status == EmailOutbox.PENDING and e.next_attempt_at <= now][:limit]
+            for entry in due:
+                entry.next_attempt_at = lease
+        return due
+    candidates = EmailOutbox.objects.filter(
+        status=EmailOutbox.PENDING, next_attempt_at__lte=now,
+    ).select_related('order').order_by('id')
+    if limit:
+        candidates = candidates[:limit]
+    claimed = []
+    for entry in candidates:
+        # Solo gana quien actualiza la fila: otro worker pudo apartarla antes
+        if EmailOutbox.objects.filter(pk=entry.pk, next_attempt_at=entry.next_attempt_at).update(next_attempt_at=lease):
+            claimed.append(entry)
+    return claimed
+
+
+def _build(entry: Any, document: OrderDocument) -> EmailMultiAlternatives:
+    builder = BUILDERS.get(entry.kind)
+    if builder is None:
+        raise ValueError(f"Tipo de correo desconocido: {entry.kind}")
+    return builder(document)
+
+
+def _record(entry: Any, error: Optional[Exception]) -> bool:
+    """Anota el resultado del envío; los fallos se reintentan con espera exponencial."""
+    if error is None:
+        entry.status = EmailOutbox.SENT
+        entry.sent_at = timezone.now()
+        print(f"Correo enviado a {entry.order.email}")
+    else:
+        entry.attempts += 1
+        entry.last_error = str(error)[:500]
+        if entry.attempts >= getattr(settings, 'ORDER_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+            entry.status = EmailOutbox.FAILED
+            print(f"[outbox] ❌ Correo {entry.kind} del pedido {entry.order.id} descartado tras {entry.attempts} intentos: {error}")
+        else:
+            delay = getattr(settings, 'ORDER_OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY) * 2 ** (entry.attempts - 1)
+            entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            print(f"[outbox] ⚠️ Error al enviar correo {entry.kind} del pedido {entry.order.id} (reintento en {delay}s): {error}")
+    if not _is_mock():
+        entry.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+    return error is None
+
+
+def drain(limit: Optional[int] = None) -> int:
+    """Envía en lote los correos pendientes que tocan ahora. Devuelve cuántos se enviaron."""
+    entries = _claim_due(limit)
+    if not entries:
+        return 0
+    errors: Dict[int, Exception] = {}
+    ready = []
+    # Líneas y productos de todos los pedidos del lote en una sola lectura
+    documents = load_many(entry.order for entry in entries)
+    for entry in entries:
+        try:
+            ready.append((entry, _build(entry, documents[entry.order.id])))
+        except Exception as e:
+            errors[id(entry)] = e
+    results = mail.send_batch([message for _, message in ready])
+    for (entry, _), error in zip(ready, results):
+        if error is not None:
+            errors[id(entry)] = error
+    sent = sum(_record(entry, errors.get(id(entry))) for entry in entries)
+    if _is_mock():
+        _persist_mock()
+    return sent
+
+
+def _run() -> None:
+    interval = getattr(settings, 'ORDER_OUTBOX_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            drain()
+        except Exception as e:
+            print(f"[outbox] ⚠️ Error vaciando la bandeja de salida: {e}")
+
+
+def wake() -> None:
+    """Avisa al hilo de envío, arrancándolo la primera vez si está activado."""
+    global _worker
+    if not getattr(settings, 'ORDER_OUTBOX_BACKGROUND', True):
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='order-outbox', daemon=True)
+            _worker.start()
+    _wakeup.set()
@@ -0,0 +1,271 @@
+"""Pasarelas de pago.
+
+``payment_process`` cobra a través de ``get_gateway()``, que devuelve la
+pasarela elegida en ``PAYMENT_GATEWAY`` (una instancia por proceso):
+
+- ``braintree``: adaptador de Braintree. El ``BraintreeGateway`` se crea una
+  sola vez y se vuelve a crear solo si cambian las credenciales.
+- ``fake``: pasarela local y determinista para pruebas de carga sin red, con
+  latencia, tasa de fallos y nonces rechazados configurables
+  (``PAYMENT_FAKE_*``). Solo se admite con ``DEBUG``: nunca cobra de verdad.
+
+También se admite la ruta de una clase propia que herede de ``PaymentGateway``.
+
+``client_tokens`` guarda el token de cliente durante
+``BRAINTREE_CLIENT_TOKEN_TTL`` segundos y lo pide a la pasarela en un hilo
+aparte: al crear un pedido pendiente de pago se adelanta la petición y la
+página de pago nunca espera a la pasarela; si aún no hay token, el navegador
+lo recoge después en ``/order/payment/client-token/``.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, Optional, Type
+
+import braintree
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+DEFAULT_TOKEN_TTL = 60 * 60
+# Se renueva en segundo plano cuando le queda menos de esta fracción de vida
+REFRESH_MARGIN = 0.2
+# Tras un fallo de la pasarela no se vuelve a pedir token hasta pasado este tiempo
+RETRY_DELAY = 10
+
+DEFAULT_GATEWAY = 'braintree'
+
+_lock = threading.Lock()
+_braintree: Optional[Any] = None
+_braintree_key: Optional[tuple] = None
+_gateways: Dict[str, 'PaymentGateway'] = {}
+
+
+def _configuration() -> Any:
+    conf = getattr(settings, 'BRAINTREE_CONF', None)
+    if not conf:
+        try:
+            from config.braintreeSettings import BRAINTREE_CONF as conf
+        except Exception:
+            conf = None
+    if not conf:
+        raise ImproperlyConfigured(
+            "BRAINTREE_CONF not found. Define settings.BRAINTREE_CONF or set config.braintreeSettings.BRAINTREE_CONF."
+        )
+    return conf
+
+
+def braintree_gateway() -> Any:
+    """
+    Gateway de Braintree del proceso, validado y creado la primera vez.
+    Raise ImproperlyConfigured if credentials are missing.
+    """
+    global _braintree, _braintree_key
+    conf = _configuration()
+    merchant = getattr(conf, 'merchant_id', None)
+    public = getattr(conf, 'public_key', None)
+    private = getattr(conf, 'private_key', None)
+    if not merchant or not public or not private:
+        raise ImproperlyConfigured(
+            "BRAINTREE_CONF missing credentials (merchant_id/public_key/private_key). "
+            "Set BRAINTREE_MERCHANT_ID, BRAINTREE_PUBLIC_KEY and BRAINTREE_PRIVATE_KEY."
+        )
+    key = (str(getattr(conf, 'environment', '')), merchant, public, private)
+    with _lock:
+        if _braintree is None or _braintree_key != key:
+            _braintree = braintree.BraintreeGateway(conf)
+            _braintree_key = key
+        return _braintree
+
+
+@dataclass
+class SaleResult:
+    success: bool
+    transaction_id: str = ''
+    message: str = ''
+
+
+class PaymentGateway:
+    """Interfaz de una pasarela de pago."""
+
+    name = ''
+
+    def check(self) -> None:
+        """Raise ImproperlyConfigured si a la pasarela le falta configuración."""
+
+    def generate_client_token(self) -> str:
+        raise NotImplementedError
+
+    def sale(self, amount: Decimal, nonce: str) -> SaleResult:
+        """Cobra ``amount`` con el método de pago del nonce y lo liquida."""
+        raise NotImplementedError
+
+
+class BraintreePaymentGateway(PaymentGateway):
+    name = 'braintree'
+
+    def check(self) -> None:
+        braintree_gateway()
+
+    def generate_client_token(self) -> str:
+        return braintree_gateway().client_token.generate()
+
+    def sale(self, amount: Decimal, nonce: str) -> SaleResult:
+        result = braintree_gateway().transaction.sale({
+            'amount': str(amount),
+            'payment_method_nonce': nonce,
+            'options': {'submit_for_settlement': True}
+        })
+        if not result.is_success:
+            return SaleResult(False, message=result.message)
+        transaction = getattr(result, 'transaction', None)
+        return SaleResult(True, transaction_id=getattr(transaction, 'id', None) or '')
+
+
+class FakePaymentGateway(PaymentGateway):
+    """Pasarela local sin red: mismo resultado para el mismo nonce e importe."""
+
+    name = 'fake'
+    CLIENT_TOKEN = 'fake-client-token'
+    VALID_NONCE = 'fake-valid-nonce'
+    DECLINED_NONCE = 'fake-processor-declined-visa-nonce'
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+
+    def _wait(self) -> None:
+        latency = float(getattr(settings, 'PAYMENT_FAKE_LATENCY', 0))
+        if latency > 0:
+            time.sleep(latency)
+
+    def _fails(self, amount: Decimal, nonce: str) -> bool:
+        rate = float(getattr(settings, 'PAYMENT_FAKE_FAILURE_RATE', 0))
+        if rate <= 0:
+            return False
+        seed = getattr(settings, 'PAYMENT_FAKE_SEED', '')
+        digest = hashlib.sha256(f"{seed}:{nonce}:{amount}".encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64 < rate
+
+    def generate_client_token(self) -> str:
+        self._wait()
+        return self.CLIENT_TOKEN
+
+    def sale(self, amount: Decimal, nonce: str) -> SaleResult:
+        self._wait()
+        if not nonce:
+            return SaleResult(False, message='Falta el método de pago.')
+        if nonce in getattr(settings, 'PAYMENT_FAKE_DECLINED_NONCES', [self.DECLINED_NONCE]):
+            return SaleResult(False, message='Pago rechazado por el banco (simulado).')
+        if self._fails(amount, nonce):
+            return SaleResult(False, message='Error de la pasarela de pago (simulado).')
+        with self._ids_lock:
+            transaction_id = f"fake-{next(self._ids):06d}"
+        return SaleResult(True, transaction_id=transaction_id)
+
+
+GATEWAYS: Dict[str, Type[PaymentGateway]] = {
+    BraintreePaymentGateway.name: BraintreePaymentGateway,
+    FakePaymentGateway.name: FakePaymentGateway,
+}
+
+
+def gateway_name() -> str:
+    return getattr(settings, 'PAYMENT_GATEWAY', DEFAULT_GATEWAY) or DEFAULT_GATEWAY
+
+
+def get_gateway() -> PaymentGateway:
+    """
+    Pasarela configurada en PAYMENT_GATEWAY, una por proceso.
+    Raise ImproperlyConfigured if it is unknown, misconfigured or fake without DEBUG.
+    """
+    name = gateway_name()
+    if name == FakePaymentGateway.name and not settings.DEBUG:
+        # Daría por pagados pedidos sin cobrarlos
+        raise ImproperlyConfigured("PAYMENT_GATEWAY 'fake' solo se permite con DEBUG = True")
+    gateway = _gateways.get(name)
+    if gateway is None:
+        try:
+            cls = GATEWAYS[name] if name in GATEWAYS else import_string(name)
+        except ImportError:
+            raise ImproperlyConfigured(f"PAYMENT_GATEWAY desconocida: {name}")
+        gateway = cls()
+        with _lock:
+            gateway = _gateways.setdefault(name, gateway)
+    gateway.check()
+    return gateway
+
+
+class ClientTokens:
+    """Token de cliente del Drop-in, cacheado y renovado en segundo plano."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._done.set()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._gateway = gateway_name()
+            self._token: Optional[str] = None
+            self._expires = 0.0
+            self._refresh_at = 0.0
+            self._retry_at = 0.0
+            self._fetching = False
+
+    def _ttl(self) -> float:
+        return getattr(settings, 'BRAINTREE_CLIENT_TOKEN_TTL', DEFAULT_TOKEN_TTL)
+
+    def _current(self, now: float) -> Optional[str]:
+        return self._token if self._token and now < self._expires else None
+
+    def prefetch(self) -> None:
+        """Pide un token nuevo en segundo plano si no hay uno vigente (o está por caducar)."""
+        if self._gateway != gateway_name():
+            # Se cambió de pasarela: el token anterior no le sirve
+            self.reset()
+        now = time.monotonic()
+        with self._lock:
+            if self._fetching or now < self._retry_at:
+                return
+            if self._current(now) and now < self._refresh_at:
+                return
+            self._fetching = True
+            self._done.clear()
+        threading.Thread(target=self._fetch, name='braintree-client-token', daemon=True).start()
+
+    def _fetch(self) -> None:
+        try:
+            token = get_gateway().generate_client_token()
+        except Exception as e:
+            print(f"[payments] ⚠️ No se pudo obtener el token de cliente de Braintree: {e}")
+            token = None
+        now = time.monotonic()
+        with self._lock:
+            if token:
+                ttl = self._ttl()
+                self._token = token
+                self._expires = now + ttl
+                self._refresh_at = now + ttl * (1 - REFRESH_MARGIN)
+            else:
+                self._retry_at = now + RETRY_DELAY
+            self._fetching = False
+        self._done.set()
+
+    def get(self, wait: float = 0) -> Optional[str]:
+        """Token vigente o None; con ``wait`` espera hasta esos segundos a que llegue uno."""
+        self.prefetch()
+        token = self._current(time.monotonic())
+        if token or not wait:
+            return token
+        self._done.wait(wait)
+        return self._current(time.monotonic())
+
+
+client_tokens = ClientTokens()
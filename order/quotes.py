@@ -0,0 +1,69 @@
+"""Presupuestos de envío del checkout (``GET /order/shipping-quote/``).
+
+El formulario de pedido pide el presupuesto cada vez que cambia el método o
+el código postal. La respuesta sale de la configuración de envío en memoria
+(order/shipping.py) y del carrito ya valorado, y se guarda en la caché una
+entrada por sesión: mientras no cambien el carrito, el código postal ni las
+tarifas, la respuesta se sirve sin consultar productos.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .shipping import config_version, method_name, quote_methods
+from .shipping_rules import normalize_postal_code
+
+KEY_PREFIX = 'order:shipping-quote'
+DEFAULT_TTL = 5 * 60
+# Los códigos postales españoles tienen cinco cifras
+POSTAL_CODE_LENGTH = 5
+
+
+def _money(value: Any) -> str:
+    return f"{float(value):.2f}"
+
+
+def _build(cart: Any, postal_code: str) -> Dict[str, Any]:
+    snapshot = cart.snapshot()
+    quotes = quote_methods(snapshot, postal_code)
+    return {
+        'success': True,
+        'postal_code': postal_code,
+        'zone': quotes[0].zone if quotes else '',
+        'items': snapshot.count,
+        'subtotal': _money(snapshot.total),
+        'quotes': [
+            {
+                'method': q.method,
+                'name': method_name(q.method),
+                'carrier': q.carrier,
+                'price': _money(q.price),
+                'total': _money(float(snapshot.total) + q.price),
+            }
+            for q in quotes
+        ],
+    }
+
+
+def for_cart(cart: Any, postal_code: str = '') -> Dict[str, Any]:
+    """Presupuesto de cada método de envío para el carrito y el código postal dados."""
+    postal_code = normalize_postal_code(postal_code)[:POSTAL_CODE_LENGTH]
+    holder = cart.holder()
+    if holder is None:
+        # Carrito vacío que nunca se guardó: no hay nada que cachear
+        return _build(cart, postal_code)
+    signature = (
+        config_version(),
+        postal_code,
+        tuple((key, line['quantity'], line['price']) for key, line in cart.cart.items()),
+    )
+    key = f"{KEY_PREFIX}:{holder}"
+    cached = cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    data = _build(cart, postal_code)
+    cache.set(key, (signature, data), getattr(settings, 'ORDER_SHIPPING_QUOTE_TTL', DEFAULT_TTL))
+    return data
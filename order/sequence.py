@@ -0,0 +1,123 @@
+"""Numeración de pedidos.
+
+Cada proceso reserva bloques de ``ORDER_NUMBER_BLOCK_SIZE`` números y los
+reparte en memoria, así que generar un número no toca el almacenamiento
+compartido salvo una vez por bloque. Con el ORM el bloque se reserva
+incrementando la fila ``OrderSequence`` bajo ``select_for_update`` (si dos
+procesos la crean a la vez, el que pierde usa la del otro); con MockDB
+(un único proceso de desarrollo) basta un contador del proceso inicializado a
+partir de los pedidos existentes.
+
+Los números son únicos y crecientes dentro de cada proceso; entre procesos
+pueden intercalarse y, si un proceso termina, los números que le quedaban del
+bloque se pierden (huecos en la numeración).
+"""
+from __future__ import annotations
+
+import re
+import threading
+
+from django.conf import settings
+
+from .models import Order, OrderSequence
+
+DEFAULT_BLOCK_SIZE = 20
+DEFAULT_PREFIX = 'MOCK'
+SEQUENCE_NAME = 'order_number'
+# Intentos de leer o crear la fila cuando otro proceso la crea a la vez
+ROW_ATTEMPTS = 3
+
+_NUMBER_RE = re.compile(r'(\d+)$')
+
+# Equivalente en MockDB de la fila OrderSequence: último número reservado
+_mock_lock = threading.Lock()
+_mock_last_value = 0
+
+
+def _number_of(order) -> int:
+    match = _NUMBER_RE.search(str(getattr(order, 'order_number', '') or ''))
+    return int(match.group(1)) if match else 0
+
+
+def _mock_high_water() -> int:
+    """Mayor número usado por los pedidos en memoria (o su id, si es mayor)."""
+    return max(
+        (max(_number_of(o), int(getattr(o, 'id', 0) or 0)) for o in Order.objects.all()),
+        default=0,
+    )
+
+
+class OrderNumberSequence:
+    """Reparte números de pedido de bloques reservados por el proceso."""
+
+    def __init__(self, block_size: int = None):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def reset(self) -> None:
+        """Descarta el bloque en curso (útil en tests)."""
+        with self._lock:
+            self._next = self._end = 0
+
+    def _size(self) -> int:
+        return max(1, self.block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+
+    def next_value(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                size = self._size()
+                self._next = self._reserve_block(size)
+                self._end = self._next + size
+            value = self._next
+            self._next += 1
+            return value
+
+    def _reserve_block(self, size: int) -> int:
+        """Reserva ``size`` números consecutivos y devuelve el primero."""
+        if hasattr(Order.objects, '_items'):
+            return _reserve_block_mock(size)
+        from django.db import transaction
+        from django.db.models import F
+        with transaction.atomic():
+            row = _locked_row()
+            start = row.last_value + 1
+            OrderSequence.objects.filter(pk=row.pk).update(last_value=F('last_value') + size)
+        return start
+
+
+def _locked_row() -> OrderSequence:
+    """Fila de la secuencia bloqueada con ``select_for_update``; la crea la primera vez."""
+    from django.db import IntegrityError, transaction
+    from django.db.models import Max
+    rows = OrderSequence.objects.select_for_update()
+    for _ in range(ROW_ATTEMPTS):
+        try:
+            return rows.get(name=SEQUENCE_NAME)
+        except OrderSequence.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return rows.create(name=SEQUENCE_NAME,
+                                   last_value=Order.objects.aggregate(last=Max('id'))['last'] or 0)
+        except IntegrityError:
+            # Otro worker la creó a la vez: en la siguiente vuelta se bloquea la suya
+            pass
+    return rows.get(name=SEQUENCE_NAME)
+
+
+def _reserve_block_mock(size: int) -> int:
+    global _mock_last_value
+    with _mock_lock:
+        start = max(_mock_last_value, _mock_high_water()) + 1
+        _mock_last_value = start + size - 1
+    return start
+
+
+sequence = OrderNumberSequence()
+
+
+def next_order_number() -> str:
+    prefix = getattr(settings, 'ORDER_NUMBER_PREFIX', DEFAULT_PREFIX)
+    return f"{prefix}-{sequence.next_value():04d}"
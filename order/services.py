@@ -0,0 +1,130 @@
+"""Creación de pedidos a partir del carrito.
+
+``place_order`` valida la instantánea del carrito, calcula los totales una sola
+vez y crea el pedido ya completo junto con todas sus líneas (``bulk_create``
+con el ORM) dentro de ``ledger.checkout``, de modo que el descuento de stock,
+el pedido y las líneas se confirman o se deshacen juntos. Con MockDB los
+fixtures JSON se escriben una única vez al final.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from shop.inventory import InsufficientStock, ledger
+from .models import Order, OrderItem
+from .sequence import next_order_number
+from .shipping import quote_cart
+from .totals import expected_total
+
+try:
+    from tests.mockdb.patcher import save_orders_to_fixture, save_order_items_to_fixture
+except Exception:
+    def save_orders_to_fixture():
+        pass
+    def save_order_items_to_fixture():
+        pass
+
+
+def _is_mock() -> bool:
+    return hasattr(Order.objects, '_items')
+
+
+def _discard_partial_order(created: List[Any]) -> None:
+    """Quita de MockDB el pedido y las líneas de un checkout fallido.
+    Con el ORM no hace falta: la transacción ya se ha deshecho.
+    """
+    for model in (Order, OrderItem):
+        items = getattr(model.objects, '_items', None)
+        if items is not None:
+            model.objects.bulk_set([o for o in items if not any(o is c for c in created)])
+
+
+def _item_rows(order: Any, snapshot) -> List[Dict[str, Any]]:
+    return [
+        {
+            'order': order,
+            'product': line.product,
+            'size': line.size or '',
+            'quantity': line.quantity,
+            'price': line.price,
+            'unit_price': line.price,
+            'line_total': line.total_price,
+        }
+        for line in snapshot
+    ]
+
+
+def _create_items(order: Any, snapshot) -> List[Any]:
+    """Todas las líneas del pedido de una vez."""
+    rows = _item_rows(order, snapshot)
+    mgr = OrderItem.objects
+    if hasattr(mgr, '_items'):
+        # En MockDB create() solo añade a la lista en memoria; se persiste al final
+        return [mgr.create(**row) for row in rows]
+    return mgr.bulk_create([OrderItem(**row) for row in rows])
+
+
+def place_order(cart, snapshot, details: Dict[str, Any], customer: Any = None,
+                status: Optional[str] = None, paid: Optional[bool] = None) -> Any:
+    """Crea el pedido del carrito y descuenta su stock en una sola operación.
+
+    ``details`` son los datos de entrega y pago del formulario. Si no se indican
+    ``status``/``paid``, los pedidos que no requieren pago (recogida en tienda o
+    contrareembolso) nacen pagados. Lanza InsufficientStock sin crear nada si
+    alguna línea supera el stock disponible.
+    """
+    if not snapshot.is_valid:
+        raise InsufficientStock([
+            ((line.product.id, line.size), line.quantity, line.stock or 0) for line in snapshot.problems
+        ])
+    shipping_method = details.get('shipping_method') or 'home'
+    payment_method = details.get('payment_method') or ''
+    if paid is None:
+        paid = not Order.payment_required_for(shipping_method, payment_method)
+    if status is None:
+        status = 'paid' if paid else 'pending'
+
+    # Totales calculados una sola vez y guardados en el pedido (ver order/totals.py)
+    subtotal = sum((line.total_price for line in snapshot), Decimal('0'))
+    shipping_cost = Decimal(str(quote_cart(snapshot, shipping_method, details.get('postal_code', '')).price))
+    lines = [(line.product.id, line.size, line.quantity) for line in snapshot]
+    # Fuera de la sección crítica: un checkout fallido solo deja un hueco en la numeración
+    order_number = next_order_number()
+    created: List[Any] = []
+    try:
+        with ledger.checkout(cart.holder(), lines):
+            order = Order.objects.create(
+                first_name=details.get('first_name', ''),
+                last_name=details.get('last_name', ''),
+                email=details.get('email', ''),
+                address=details.get('address', ''),
+                postal_code=details.get('postal_code', ''),
+                city=details.get('city', ''),
+                phone=details.get('phone') or '',
+                order_number=order_number,
+                status=status,
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                shipping_method=shipping_method,
+                taxes=Decimal('0'),
+                discount=Decimal('0'),
+                total=expected_total(subtotal, shipping_cost),
+                paid=paid,
+                payment_method=payment_method,
+                customer=customer,
+            )
+            created.append(order)
+            created.extend(_create_items(order, snapshot))
+    except Exception:
+        _discard_partial_order(created)
+        raise
+
+    if _is_mock():
+        try:
+            save_orders_to_fixture()
+            save_order_items_to_fixture()
+            print(f"✅ Pedido {order.order_number} guardado correctamente en JSON")
+        except Exception as e:
+            print(f"❌ Error al persistir pedido: {e}")
+    return order
@@ -1,24 +1,54 @@
+"""Métodos de envío y sus tarifas.
+
+La configuración se lee de ``tests/mockdb/data/shipping.json`` una sola vez y
+queda en memoria con los métodos indexados por código y las reglas por zona
+ya compiladas (ver order/shipping_rules.py). Como mucho cada
+``SHIPPING_CONFIG_CHECK_INTERVAL`` segundos se comprueba la fecha de
+modificación del fichero y, si ha cambiado, se vuelve a leer.
+
+Los métodos sin regla para la zona del pedido cobran su precio fijo, con envío
+gratis a domicilio a partir de ``free_shipping_threshold``.
+"""
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
 
+from .shipping_rules import RuleSet, ZoneTrie
+
+DEFAULT_CHECK_INTERVAL = 1.0
+DEFAULT_ZONE = 'peninsula'
+# Peso (kg) de un par cuando el producto no indica el suyo
+DEFAULT_ITEM_WEIGHT = 1.0
+
 
 @dataclass
 class ShippingMethod:
     code: str
     name: str
     price: float
+    carrier: str = ''
 
 
 @dataclass
 class ShippingConfig:
     free_shipping_threshold: float
     methods: List[ShippingMethod]
+    zones: ZoneTrie = field(default_factory=lambda: ZoneTrie({}, DEFAULT_ZONE), repr=False)
+    rules: RuleSet = field(default_factory=lambda: RuleSet({}), repr=False)
+    default_item_weight: float = DEFAULT_ITEM_WEIGHT
+    by_code: Dict[str, ShippingMethod] = field(init=False, repr=False)
+    choices: List[Tuple[str, str]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.by_code = {m.code: m for m in self.methods}
+        self.choices = [(m.code, m.name) for m in self.methods]
 
 
 _DEFAULT_CONFIG = ShippingConfig(
@@ -29,48 +59,182 @@ _DEFAULT_CONFIG = ShippingConfig(
     ],
 )
 
+_lock = threading.Lock()
+# (configuración, firma del fichero, instante de la última comprobación)
+_cached: Optional[Tuple[ShippingConfig, Optional[Tuple[int, int]], float]] = None
+
 
 def _project_root() -> Path:
     base = Path(settings.BASE_DIR)
     return base.parent if base.name == "config" else base
 
 
-def load_config() -> ShippingConfig:
+def _data_path() -> Path:
+    return _project_root() / "tests" / "mockdb" / "data" / "shipping.json"
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
     try:
-        data_path = _project_root() / "tests" / "mockdb" / "data" / "shipping.json"
-        if data_path.exists():
-            data = json.loads(data_path.read_text(encoding="utf-8"))
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _parse(path: Path) -> ShippingConfig:
+    try:
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
             threshold = float(data.get("free_shipping_threshold", 50.0))
             methods = [
-                ShippingMethod(code=m["code"], name=m["name"], price=float(m.get("price", 0)))
+                ShippingMethod(code=m["code"], name=m["name"], price=float(m.get("price", 0)),
+                               carrier=m.get("carrier", ""))
                 for m in data.get("methods", [])
             ]
             if methods:
-                return ShippingConfig(free_shipping_threshold=threshold, methods=methods)
-    except Exception:
-        pass
+                zones = data.get("zones") or {}
+                return ShippingConfig(
+                    free_shipping_threshold=threshold,
+                    methods=methods,
+                    zones=ZoneTrie(zones.get("prefixes", {}), zones.get("default", DEFAULT_ZONE)),
+                    rules=RuleSet.compile(data.get("rules", []), {m.code: m.carrier for m in methods}),
+                    default_item_weight=float(data.get("default_item_weight", DEFAULT_ITEM_WEIGHT)),
+                )
+    except Exception as e:
+        print(f"[shipping] ⚠️ No se pudo leer {path.name}, se usan las tarifas por defecto: {e}")
     return _DEFAULT_CONFIG
 
 
+def load_config() -> ShippingConfig:
+    """Configuración de envío en memoria; se relee solo si el fichero ha cambiado."""
+    global _cached
+    now = time.monotonic()
+    cached = _cached
+    interval = getattr(settings, 'SHIPPING_CONFIG_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    if cached is not None and now - cached[2] < interval:
+        return cached[0]
+    path = _data_path()
+    signature = _signature(path)
+    if cached is not None and cached[1] == signature:
+        _cached = (cached[0], signature, now)
+        return cached[0]
+    with _lock:
+        # Otro hilo pudo releerlo mientras esperábamos
+        if _cached is not None and _cached[1] == signature:
+            _cached = (_cached[0], signature, now)
+            return _cached[0]
+        config = _parse(path)
+        _cached = (config, signature, now)
+    return config
+
+
+def config_version() -> Optional[Tuple[int, int]]:
+    """Firma del fichero de la configuración en memoria, igual en todos los procesos.
+
+    Sirve de versión para cachés que guardan resultados calculados con ella.
+    """
+    load_config()
+    cached = _cached
+    return cached[1] if cached is not None else None
+
+
+def clear_cache() -> None:
+    """Olvida la configuración en memoria; la siguiente consulta relee el fichero."""
+    global _cached
+    _cached = None
+
+
 def method_choices() -> List[Tuple[str, str]]:
-    return [(m.code, m.name) for m in load_config().methods]
+    return list(load_config().choices)
+
 
+def get_method(method_code: str) -> Optional[ShippingMethod]:
+    return load_config().by_code.get(method_code)
 
-def compute_shipping(subtotal: float, method_code: str) -> float:
+
+@dataclass
+class QuoteRequest:
+    subtotal: float
+    method: str
+    postal_code: str = ''
+    items: int = 0
+    # Sin peso se estima con ``default_item_weight`` por unidad
+    weight: Optional[float] = None
+
+
+@dataclass
+class Quote:
+    method: str
+    zone: str
+    carrier: str
+    price: float
+
+
+def _quote(cfg: ShippingConfig, req: QuoteRequest, zone: str) -> Quote:
+    # Método desconocido: se cobra el primero
+    m = cfg.by_code.get(req.method) or cfg.methods[0]
+    rule = cfg.rules.find(m.code, zone)
+    if rule is None:
+        # Envío gratuito si supera el umbral y el método es a domicilio
+        if req.method == "home" and req.subtotal >= cfg.free_shipping_threshold:
+            price = 0.0
+        else:
+            price = float(m.price)
+        return Quote(method=m.code, zone=zone, carrier=m.carrier, price=price)
+    weight = req.weight if req.weight is not None else req.items * cfg.default_item_weight
+    return Quote(method=m.code, zone=zone, carrier=rule.carrier,
+                 price=rule.price(float(req.subtotal), req.items, weight))
+
+
+def quote(subtotal: float, method_code: str, postal_code: str = '', items: int = 0,
+          weight: Optional[float] = None) -> Quote:
     cfg = load_config()
-    # Buscar método
-    m: Optional[ShippingMethod] = next((x for x in cfg.methods if x.code == method_code), None)
-    if m is None:
-        # Fallback al primero
-        m = cfg.methods[0]
-    # Envío gratuito si supera el umbral y el método es a domicilio
-    if method_code == "home" and subtotal >= cfg.free_shipping_threshold:
-        return 0.0
-    return float(m.price)
+    req = QuoteRequest(subtotal, method_code, postal_code, items, weight)
+    return _quote(cfg, req, cfg.zones.lookup(postal_code))
+
+
+def quote_many(requests: Iterable[QuoteRequest]) -> List[Quote]:
+    """Presupuesta muchos envíos con la misma configuración, en el mismo orden."""
+    cfg = load_config()
+    zones: Dict[str, str] = {}
+    quotes = []
+    for req in requests:
+        zone = zones.get(req.postal_code)
+        if zone is None:
+            zone = zones[req.postal_code] = cfg.zones.lookup(req.postal_code)
+        quotes.append(_quote(cfg, req, zone))
+    return quotes
+
+
+def cart_request(snapshot: Any, method_code: str, postal_code: str = '') -> QuoteRequest:
+    """Petición de presupuesto para un carrito (``CartSnapshot``)."""
+    cfg = load_config()
+    weight = 0.0
+    for line in snapshot:
+        unit = getattr(line.product, 'weight', None)
+        weight += float(unit if unit is not None else cfg.default_item_weight) * line.quantity
+    return QuoteRequest(float(snapshot.total), method_code, postal_code or '', snapshot.count, weight)
+
+
+def quote_cart(snapshot: Any, method_code: str, postal_code: str = '') -> Quote:
+    return quote_many([cart_request(snapshot, method_code, postal_code)])[0]
+
+
+def quote_methods(snapshot: Any, postal_code: str = '') -> List[Quote]:
+    """Presupuesto del carrito con cada método de envío, en el orden de la configuración."""
+    base = cart_request(snapshot, '', postal_code)
+    return quote_many(
+        QuoteRequest(base.subtotal, code, base.postal_code, base.items, base.weight)
+        for code, _ in load_config().choices
+    )
+
+
+def compute_shipping(subtotal: float, method_code: str, postal_code: str = '', items: int = 0,
+                     weight: Optional[float] = None) -> float:
+    return quote(subtotal, method_code, postal_code, items, weight).price
 
 
 def method_name(method_code: str) -> str:
     """Devuelve el nombre legible del método de envío para mostrar en UI."""
-    cfg = load_config()
-    m = next((x for x in cfg.methods if x.code == method_code), None)
+    m = load_config().by_code.get(method_code)
     return m.name if m else method_code
@@ -0,0 +1,137 @@
+"""Reglas de tarifas de envío por zona, transportista y tramos.
+
+Las reglas de ``shipping.json`` se compilan una vez (ver order/shipping.py):
+
+- ``ZoneTrie``: árbol de prefijos de código postal -> zona (``07`` Baleares,
+  ``35``/``38`` Canarias...). Gana el prefijo más largo; sin coincidencia se
+  usa la zona por defecto.
+- ``TierTable``: tramos por unidades o por peso como tabla de intervalos; el
+  precio se busca con bisección.
+- ``RuleSet``: regla ya resuelta por (método, zona). Las reglas de un
+  transportista se aplican a todos sus métodos salvo que el método tenga una
+  regla propia para esa zona.
+
+Presupuestar un envío es una consulta al árbol, un acceso a diccionario y una
+bisección, sin recorrer la lista de reglas.
+"""
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ANY_ZONE = '*'
+ITEMS = 'items'
+WEIGHT = 'weight'
+
+
+class ZoneTrie:
+    """Prefijos de código postal -> zona, con búsqueda del prefijo más largo."""
+
+    def __init__(self, prefixes: Dict[str, Iterable[str]], default: str):
+        self.default = default
+        self._root: Dict[str, Any] = {}
+        for zone, codes in prefixes.items():
+            for prefix in codes:
+                node = self._root
+                for ch in str(prefix):
+                    node = node.setdefault(ch, {})
+                node[None] = zone
+
+    def lookup(self, postal_code: str) -> str:
+        zone = self.default
+        node = self._root
+        for ch in normalize_postal_code(postal_code):
+            node = node.get(ch)
+            if node is None:
+                break
+            zone = node.get(None, zone)
+        return zone
+
+
+class TierTable:
+    """Tramos ``hasta X -> precio``; el último tramo puede no tener límite."""
+
+    def __init__(self, tiers: Iterable[Dict[str, Any]]):
+        rows = sorted(
+            ((float(t['up_to']) if t.get('up_to') is not None else float('inf'), float(t.get('price', 0)))
+             for t in tiers),
+            key=lambda row: row[0],
+        )
+        if not rows:
+            raise ValueError('Una regla de envío necesita al menos un tramo')
+        self.bounds = [bound for bound, _ in rows]
+        self.prices = [price for _, price in rows]
+
+    def price_for(self, amount: float) -> float:
+        # Por encima del último límite se cobra el último tramo
+        index = min(bisect.bisect_left(self.bounds, amount), len(self.prices) - 1)
+        return self.prices[index]
+
+
+@dataclass
+class Rule:
+    zone: str
+    tiers: TierTable
+    basis: str = ITEMS
+    carrier: str = ''
+    free_over: Optional[float] = None
+
+    def price(self, subtotal: float, items: int, weight: float) -> float:
+        if self.free_over is not None and subtotal >= self.free_over:
+            return 0.0
+        return self.tiers.price_for(weight if self.basis == WEIGHT else items)
+
+
+def normalize_postal_code(postal_code: Any) -> str:
+    return ''.join(ch for ch in str(postal_code or '') if ch.isdigit())
+
+
+def compile_rule(data: Dict[str, Any], carrier: str = '') -> Rule:
+    basis = data.get('basis', ITEMS)
+    if basis not in (ITEMS, WEIGHT):
+        raise ValueError(f"Base de tramos desconocida: {basis}")
+    free_over = data.get('free_over')
+    return Rule(
+        zone=data.get('zone', ANY_ZONE),
+        tiers=TierTable(data.get('tiers') or [{'price': data.get('price', 0)}]),
+        basis=basis,
+        carrier=data.get('carrier', carrier) or carrier,
+        free_over=float(free_over) if free_over is not None else None,
+    )
+
+
+class RuleSet:
+    """Reglas resueltas por (método, zona)."""
+
+    def __init__(self, rules: Dict[Tuple[str, str], Rule]):
+        self._rules = rules
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def find(self, method_code: str, zone: str) -> Optional[Rule]:
+        return self._rules.get((method_code, zone)) or self._rules.get((method_code, ANY_ZONE))
+
+    @classmethod
+    def compile(cls, rules: Iterable[Dict[str, Any]], carriers: Dict[str, str]) -> 'RuleSet':
+        """``carriers`` es método -> transportista."""
+        by_carrier: Dict[str, List[Dict[str, Any]]] = {}
+        by_method: Dict[str, List[Dict[str, Any]]] = {}
+        for data in rules:
+            if data.get('method'):
+                by_method.setdefault(data['method'], []).append(data)
+            elif data.get('carrier'):
+                by_carrier.setdefault(data['carrier'], []).append(data)
+            else:
+                raise ValueError(f"La regla de envío no indica método ni transportista: {data}")
+        table: Dict[Tuple[str, str], Rule] = {}
+        for method_code, carrier in carriers.items():
+            # Primero las del transportista para que las del método las sustituyan
+            for data in by_carrier.get(carrier, []) if carrier else []:
+                rule = compile_rule(data, carrier)
+                table[(method_code, rule.zone)] = rule
+            for data in by_method.get(method_code, []):
+                rule = compile_rule(data, carrier)
+                table[(method_code, rule.zone)] = rule
+        return cls(table)
@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase
+
+from order import documents
+from order.models import Order, OrderItem
+
+
+class TestOrderDocuments(SimpleTestCase):
+
+    def setUp(self):
+        self.order = next(o for o in Order.objects.all() if any(i.order is o for i in OrderItem.objects.all()))
+        self.items = [i for i in OrderItem.objects.all() if i.order is self.order]
+
+    def test_all_documents_share_one_load(self):
+        doc = documents.load(self.order)
+        self.assertEqual(doc.items, self.items)
+        for item in self.items:
+            self.assertIn(item.product.name, doc.html)
+            self.assertIn(item.product.name, doc.text)
+            self.assertIn(item.product.name, doc.ticket)
+        self.assertIn(f'Numero de pedido: {self.order.order_number}', doc.ticket)
+        self.assertIs(doc.text, doc.text)
+
+    def test_text_documents_are_not_html_escaped(self):
+        self.items[0].product.name, original = 'Botas & Co', self.items[0].product.name
+        try:
+            doc = documents.load(self.order)
+            self.assertIn('Botas & Co', doc.ticket)
+            self.assertIn('Botas & Co', doc.text)
+            self.assertIn('Botas &amp; Co', doc.html)
+        finally:
+            self.items[0].product.name = original
+
+    def test_message_has_text_and_html_parts(self):
+        message = documents.load(self.order).confirmation_message()
+        self.assertEqual(message.to, [self.order.email])
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+
+    def test_load_many_groups_items_by_order(self):
+        docs = documents.load_many(Order.objects.all())
+        self.assertEqual(sum(len(d.items) for d in docs.values()),
+                         sum(1 for i in OrderItem.objects.all() if getattr(i.order, 'id', None) in docs))
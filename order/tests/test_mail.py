@@ -0,0 +1,97 @@
+import socketserver
+import threading
+
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, override_settings
+
+from order import mail
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages; drops the connection after `drop_after` messages."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        delivered = 0
+        self.reply('220 localhost stand-in')
+        for raw in self.rfile:
+            command = raw.decode('ascii', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                delivered += 1
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 queued')
+                if server.drop_after and delivered >= server.drop_after:
+                    return
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after=0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.drop_after = drop_after
+
+
+class TestPooledMail(SimpleTestCase):
+
+    def start_server(self, drop_after=0):
+        server = _SMTPServer(drop_after)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            ORDER_MAIL_BATCH_SIZE=10,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(mail.pool.close_all)
+        mail.pool.close_all()
+        return server
+
+    def messages(self, n):
+        return [EmailMessage(f'Pedido {i}', 'cuerpo', 'shop@example.com', [f'c{i}@example.com']) for i in range(n)]
+
+    def test_batches_reuse_one_connection(self):
+        server = self.start_server()
+        self.assertEqual(mail.send_batch(self.messages(25)), [None] * 25)
+        self.assertEqual(mail.send_batch(self.messages(5)), [None] * 5)
+        self.assertEqual((server.connections, server.messages), (1, 30))
+
+    def test_reconnects_when_server_drops_connection(self):
+        server = self.start_server(drop_after=3)
+        self.assertEqual(mail.send_batch(self.messages(7)), [None] * 7)
+        self.assertEqual(server.messages, 7)
+        self.assertEqual(server.connections, 3)
+
+    def test_unreachable_server_fails_every_message(self):
+        server = self.start_server()
+        server.shutdown()
+        server.server_close()
+        with override_settings(EMAIL_PORT=1):
+            errors = mail.send_batch(self.messages(3))
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, OSError) for e in errors))
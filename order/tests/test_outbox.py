@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+from django.core import mail
+from django.test import Client, SimpleTestCase, override_settings
+
+from order import outbox
+from order.models import EmailOutbox, Order
+
+
+@override_settings(ORDER_OUTBOX_BACKGROUND=False, ORDER_OUTBOX_MAX_ATTEMPTS=2)
+@patch('tests.mockdb.patcher.save_email_outbox_to_fixture')
+class TestEmailOutbox(SimpleTestCase):
+
+    def setUp(self):
+        self.entries = list(EmailOutbox.objects._items)
+        self.order = Order.objects.all().first()
+
+    def tearDown(self):
+        EmailOutbox.objects.bulk_set(self.entries)
+
+    def entry(self):
+        return next(e for e in EmailOutbox.objects.all() if e.order is self.order)
+
+    def test_one_email_per_order(self, _):
+        self.assertTrue(outbox.enqueue_confirmation(self.order))
+        self.assertFalse(outbox.enqueue_confirmation(self.order))
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(outbox.drain(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.entry().status, EmailOutbox.SENT)
+
+    def test_failures_are_retried_later_then_given_up(self, _):
+        outbox.enqueue_confirmation(self.order)
+        failing = lambda messages: [OSError('smtp down')] * len(messages)
+        with patch('order.mail.send_batch', failing):
+            self.assertEqual(outbox.drain(), 0)
+            entry = self.entry()
+            self.assertEqual((entry.status, entry.attempts, entry.last_error), (EmailOutbox.PENDING, 1, 'smtp down'))
+            # Not due again until the backoff expires
+            self.assertEqual(outbox.drain(), 0)
+            self.assertEqual(entry.attempts, 1)
+            entry.next_attempt_at = entry.next_attempt_at.replace(year=2000)
+            outbox.drain()
+        self.assertEqual((entry.status, entry.attempts), (EmailOutbox.FAILED, 2))
+
+    # Sin USE_MOCKDB=1 las sesiones y la búsqueda del pedido irían a la base de datos (motor dummy)
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies', USE_MOCKDB=True)
+    def test_confirmation_page_does_not_wait_for_smtp(self, _):
+        with patch('order.mail.send_batch') as send:
+            for _ in range(2):
+                response = Client().get(f'/order/created/{self.order.id}/')
+                self.assertEqual(response.status_code, 200)
+        send.assert_not_called()
+        self.assertEqual(self.entry().status, EmailOutbox.PENDING)
@@ -0,0 +1,108 @@
+import threading
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import braintree
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client, SimpleTestCase, override_settings
+
+from order import payments
+from order.models import Order
+
+
+def _conf(merchant='merchant', public='public', private='private'):
+    return braintree.Configuration(braintree.Environment.Sandbox, merchant_id=merchant,
+                                   public_key=public, private_key=private)
+
+
+class TestSharedGateway(SimpleTestCase):
+
+    def test_one_gateway_per_configuration(self):
+        with override_settings(BRAINTREE_CONF=_conf()):
+            first = payments.braintree_gateway()
+            self.assertIs(payments.braintree_gateway(), first)
+            self.assertIsInstance(payments.get_gateway(), payments.BraintreePaymentGateway)
+        with override_settings(BRAINTREE_CONF=_conf(private='rotated')):
+            self.assertIsNot(payments.braintree_gateway(), first)
+
+    def test_missing_credentials(self):
+        with override_settings(BRAINTREE_CONF=_conf(private=None)):
+            with self.assertRaises(ImproperlyConfigured):
+                payments.get_gateway()
+
+
+class TestClientTokens(SimpleTestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.gateway = MagicMock()
+        self.gateway.generate_client_token.side_effect = lambda: self.release.wait(5) and 'token-1'
+        gateway_patch = patch('order.payments.get_gateway', return_value=self.gateway)
+        gateway_patch.start()
+        self.addCleanup(gateway_patch.stop)
+        self.addCleanup(self.release.set)
+        payments.client_tokens.reset()
+        self.addCleanup(payments.client_tokens.reset)
+
+    def test_token_is_fetched_in_background_and_cached(self):
+        self.assertIsNone(payments.client_tokens.get())
+        self.assertIsNone(payments.client_tokens.get())
+        self.release.set()
+        self.assertEqual(payments.client_tokens.get(wait=5), 'token-1')
+        self.assertEqual(payments.client_tokens.get(), 'token-1')
+        self.assertEqual(self.gateway.generate_client_token.call_count, 1)
+
+    # Sin USE_MOCKDB=1 las sesiones y la búsqueda del pedido irían a la base de datos (motor dummy)
+    @override_settings(BRAINTREE_CONF=_conf(), USE_MOCKDB=True,
+                       SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_payment_page_does_not_wait_for_braintree(self):
+        order = Order.objects.all().first()
+        response = Client().get(f'/order/payment/{order.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['client_token'])
+        self.release.set()
+        response = Client().get('/order/payment/client-token/')
+        self.assertEqual(response.json(), {'success': True, 'client_token': 'token-1'})
+
+
+@override_settings(DEBUG=True, PAYMENT_GATEWAY='fake', PAYMENT_FAKE_LATENCY=0, PAYMENT_FAKE_FAILURE_RATE=0)
+class TestFakeGateway(SimpleTestCase):
+
+    def setUp(self):
+        payments.client_tokens.reset()
+        self.addCleanup(payments.client_tokens.reset)
+
+    def test_refused_without_debug(self):
+        with override_settings(DEBUG=False):
+            with self.assertRaises(ImproperlyConfigured):
+                payments.get_gateway()
+
+    def test_declined_nonces_and_deterministic_failures(self):
+        gateway = payments.get_gateway()
+        self.assertIsInstance(gateway, payments.FakePaymentGateway)
+        self.assertTrue(gateway.sale(Decimal('10.00'), 'fake-valid-nonce').success)
+        declined = gateway.sale(Decimal('10.00'), 'fake-processor-declined-visa-nonce')
+        self.assertEqual((declined.success, declined.transaction_id), (False, ''))
+        with override_settings(PAYMENT_FAKE_FAILURE_RATE=0.3):
+            runs = [[gateway.sale(Decimal('10.00'), f'nonce-{i}').success for i in range(200)] for _ in range(2)]
+        self.assertEqual(runs[0], runs[1])
+        self.assertTrue(40 <= runs[0].count(False) <= 80)
+
+    # Sin USE_MOCKDB=1 las sesiones y la búsqueda del pedido irían a la base de datos (motor dummy)
+    @override_settings(USE_MOCKDB=True, SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    @patch('order.views.save_orders_to_fixture')
+    def test_pays_an_order_without_network(self, _):
+        order = next(o for o in Order.objects.all() if not o.paid)
+        saved = dict(vars(order))
+        self.addCleanup(lambda: (vars(order).clear(), vars(order).update(saved)))
+        client = Client()
+        page = client.get(f'/order/payment/{order.id}/')
+        self.assertEqual(page.context['gateway'], 'fake')
+        self.assertEqual(client.get('/order/payment/client-token/').json()['client_token'], 'fake-client-token')
+        declined = client.post(f'/order/payment/{order.id}/', {'payment_method_nonce': 'fake-processor-declined-visa-nonce'})
+        self.assertContains(declined, 'rechazado')
+        self.assertFalse(order.paid)
+        response = client.post(f'/order/payment/{order.id}/', {'payment_method_nonce': 'fake-valid-nonce'})
+        self.assertRedirects(response, f'/order/created/{order.id}/', fetch_redirect_response=False)
+        self.assertTrue(order.paid)
+        self.assertTrue(order.braintree_id.startswith('fake-'))
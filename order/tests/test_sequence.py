@@ -0,0 +1,57 @@
+import threading
+from unittest.mock import patch
+
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, override_settings
+
+from order.models import Order, OrderSequence
+from order.sequence import SEQUENCE_NAME, OrderNumberSequence, next_order_number, sequence
+from tests.mockdb.sqlite import sqlite_database
+
+
+class TestOrderNumberSequence(SimpleTestCase):
+
+    def test_numbers_start_after_existing_orders(self):
+        sequence.reset()
+        highest = max(int(o.order_number.rsplit('-', 1)[-1]) for o in Order.objects.all())
+        self.assertGreater(int(next_order_number().rsplit('-', 1)[-1]), highest)
+
+    @override_settings(ORDER_NUMBER_BLOCK_SIZE=5)
+    def test_workers_get_disjoint_monotonic_blocks(self):
+        workers = [OrderNumberSequence() for _ in range(4)]
+        drawn = {i: [] for i in range(len(workers))}
+        barrier = threading.Barrier(len(workers))
+
+        def draw(i):
+            barrier.wait()
+            drawn[i].extend(workers[i].next_value() for _ in range(23))
+
+        threads = [threading.Thread(target=draw, args=(i,)) for i in range(len(workers))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        values = [v for numbers in drawn.values() for v in numbers]
+        self.assertEqual(len(values), len(set(values)))
+        for numbers in drawn.values():
+            self.assertEqual(numbers, sorted(numbers))
+
+    @override_settings(ORDER_NUMBER_BLOCK_SIZE=5)
+    def test_first_block_survives_a_concurrent_row_insert(self):
+        original_get = QuerySet.get
+        missed = []
+
+        def get(qs, *args, **kwargs):
+            # Este worker no ve (aún) la fila que otro acaba de crear
+            if qs.model is OrderSequence and len(missed) < 2:
+                missed.append(True)
+                raise OrderSequence.DoesNotExist
+            return original_get(qs, *args, **kwargs)
+
+        with sqlite_database(Order, OrderSequence):
+            OrderSequence.objects.create(name=SEQUENCE_NAME, last_value=100)
+            with patch.object(QuerySet, 'get', get):
+                self.assertEqual(OrderNumberSequence().next_value(), 101)
+            self.assertEqual(len(missed), 2)
+            self.assertEqual(OrderSequence.objects.get(name=SEQUENCE_NAME).last_value, 105)
@@ -0,0 +1,70 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from cart.cart import CartLine, CartSnapshot
+from order.models import Order, OrderItem
+from order.services import place_order
+from shop.inventory import InsufficientStock, ledger
+from shop.models import ProductSize
+
+
+@patch('tests.mockdb.patcher.save_product_sizes_to_fixture')
+@patch('tests.mockdb.patcher.save_products_to_fixture')
+@patch('order.services.save_order_items_to_fixture')
+@patch('order.services.save_orders_to_fixture')
+class TestPlaceOrder(SimpleTestCase):
+
+    details = {
+        'first_name': 'Ana', 'last_name': 'Ruiz', 'email': 'ana@example.com', 'address': 'Calle 1',
+        'postal_code': '28001', 'city': 'Madrid', 'phone': '600000000',
+        'shipping_method': 'store', 'payment_method': 'cod',
+    }
+
+    def setUp(self):
+        ledger.reset()
+        self.cart = SimpleNamespace(holder=lambda: None)
+        self.sizes = [s for s in ProductSize.objects.all() if s.stock > 1][:2]
+        self.stock = [(s, s.stock, s.product.stock) for s in self.sizes]
+        self.orders = list(Order.objects._items)
+        self.items = list(OrderItem.objects._items)
+
+    def tearDown(self):
+        for size, stock, product_stock in self.stock:
+            size.stock, size.product.stock = stock, product_stock
+        Order.objects.bulk_set(self.orders)
+        OrderItem.objects.bulk_set(self.items)
+        ledger.reset()
+
+    def snapshot(self, quantity=2):
+        return CartSnapshot([
+            CartLine(f'{s.product.id}_{s.size}', s.product, s.size, quantity, Decimal('10.50'), s.stock)
+            for s in self.sizes
+        ])
+
+    def test_creates_order_and_items_with_totals_once(self, save_orders, save_items, *_):
+        order = place_order(self.cart, self.snapshot(), self.details)
+        items = [i for i in OrderItem.objects.all() if i.order is order]
+        self.assertEqual(order.subtotal, Decimal('42.00'))
+        self.assertEqual(order.total, order.subtotal + order.shipping_cost)
+        self.assertTrue(order.paid)
+        self.assertEqual(order.status, 'paid')
+        self.assertEqual([(i.size, i.unit_price, i.line_total) for i in items],
+                         [(s.size, Decimal('10.50'), Decimal('21.00')) for s in self.sizes])
+        self.assertEqual([s.stock for s in self.sizes], [stock - 2 for _, stock, _ in self.stock])
+        save_orders.assert_called_once()
+        save_items.assert_called_once()
+
+    def test_card_orders_wait_for_payment(self, *_):
+        order = place_order(self.cart, self.snapshot(), dict(self.details, shipping_method='home', payment_method='card'))
+        self.assertFalse(order.paid)
+        self.assertEqual(order.status, 'pending')
+
+    def test_invalid_snapshot_creates_nothing(self, save_orders, *_):
+        snapshot = self.snapshot(quantity=self.sizes[0].stock + 1)
+        with self.assertRaises(InsufficientStock):
+            place_order(self.cart, snapshot, self.details)
+        self.assertEqual(len(Order.objects._items), len(self.orders))
+        save_orders.assert_not_called()
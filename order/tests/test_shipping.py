@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from order import shipping
+from order.shipping_rules import RuleSet
+
+
+@override_settings(SHIPPING_CONFIG_CHECK_INTERVAL=0)
+class TestShippingConfigCache(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'shipping.json'
+        self.write(4.99)
+        path_patch = patch('order.shipping._data_path', return_value=self.path)
+        path_patch.start()
+        self.addCleanup(path_patch.stop)
+        shipping.clear_cache()
+        self.addCleanup(shipping.clear_cache)
+
+    def write(self, home_price, mtime=None):
+        self.path.write_text(json.dumps({
+            'free_shipping_threshold': 50.0,
+            'methods': [
+                {'code': 'home', 'name': 'Envío a domicilio', 'price': home_price},
+                {'code': 'store', 'name': 'Recogida en tienda', 'price': 0.0},
+            ],
+        }), encoding='utf-8')
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_file_is_parsed_once(self):
+        with patch('order.shipping._parse', wraps=shipping._parse) as parse:
+            for _ in range(10):
+                shipping.compute_shipping(10, 'home')
+                shipping.method_name('store')
+                shipping.method_choices()
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(shipping.compute_shipping(10, 'home'), 4.99)
+        self.assertEqual(shipping.compute_shipping(60, 'home'), 0.0)
+        self.assertEqual(shipping.compute_shipping(10, 'unknown'), 4.99)
+        self.assertEqual(shipping.method_name('store'), 'Recogida en tienda')
+        self.assertEqual(shipping.method_name('unknown'), 'unknown')
+
+    def test_changed_file_is_reloaded(self):
+        self.assertEqual(shipping.compute_shipping(10, 'home'), 4.99)
+        self.write(5.99, mtime=self.path.stat().st_mtime + 5)
+        self.assertEqual(shipping.compute_shipping(10, 'home'), 5.99)
+
+    @override_settings(SHIPPING_CONFIG_CHECK_INTERVAL=3600)
+    def test_file_is_not_checked_within_interval(self):
+        shipping.load_config()
+        with patch('order.shipping._signature') as signature:
+            shipping.compute_shipping(10, 'home')
+        signature.assert_not_called()
+
+    def test_missing_file_falls_back_to_defaults(self):
+        self.path.unlink()
+        self.assertEqual(shipping.method_choices(), shipping._DEFAULT_CONFIG.choices)
+
+
+class TestShippingRules(SimpleTestCase):
+
+    def setUp(self):
+        shipping.clear_cache()
+        self.addCleanup(shipping.clear_cache)
+
+    def test_zone_by_postal_code_prefix(self):
+        zones = shipping.load_config().zones
+        self.assertEqual(zones.lookup('28001'), 'peninsula')
+        self.assertEqual(zones.lookup('07001'), 'baleares')
+        self.assertEqual(zones.lookup('35 001'), 'canarias')
+        self.assertEqual(zones.lookup('38400'), 'canarias')
+        self.assertEqual(zones.lookup('52001'), 'ceuta_melilla')
+        self.assertEqual(zones.lookup(''), 'peninsula')
+
+    def test_peninsula_keeps_flat_rate_and_free_threshold(self):
+        self.assertEqual(shipping.compute_shipping(10, 'home', '28001', items=3), 4.99)
+        self.assertEqual(shipping.compute_shipping(60, 'home', '28001', items=3), 0.0)
+        self.assertEqual(shipping.compute_shipping(10, 'store', '35001', items=3), 0.0)
+
+    def test_tiers_by_items_and_weight(self):
+        self.assertEqual(shipping.compute_shipping(30, 'home', '07001', items=2), 7.99)
+        self.assertEqual(shipping.compute_shipping(30, 'home', '07001', items=3), 11.99)
+        self.assertEqual(shipping.compute_shipping(150, 'home', '07001', items=3), 0.0)
+        # Canarias no tiene envío gratis: tramos por peso
+        self.assertEqual(shipping.compute_shipping(500, 'home', '35001', weight=1.5), 12.99)
+        self.assertEqual(shipping.compute_shipping(500, 'home', '35001', weight=2.5), 18.99)
+        self.assertEqual(shipping.compute_shipping(500, 'home', '35001', weight=40), 29.99)
+        # Sin peso se estima por unidades
+        self.assertEqual(shipping.compute_shipping(500, 'home', '35001', items=3), 18.99)
+
+    def test_quote_many_matches_single_quotes(self):
+        requests = [
+            shipping.QuoteRequest(subtotal, 'home', postal_code, items)
+            for subtotal in (10, 75, 120)
+            for postal_code in ('28001', '07001', '38001', '51001')
+            for items in (1, 3, 8)
+        ]
+        quotes = shipping.quote_many(requests)
+        self.assertEqual(len(quotes), len(requests))
+        for req, quote in zip(requests, quotes):
+            self.assertEqual(quote, shipping.quote(req.subtotal, req.method, req.postal_code, req.items))
+        self.assertEqual({q.carrier for q in quotes}, {'correos'})
+
+    def test_method_rule_overrides_carrier_rule(self):
+        rules = RuleSet.compile([
+            {'carrier': 'correos', 'zone': '*', 'tiers': [{'price': 5}]},
+            {'method': 'express', 'zone': 'canarias', 'tiers': [{'price': 20}]},
+        ], {'home': 'correos', 'express': 'correos'})
+        self.assertEqual(rules.find('home', 'canarias').tiers.price_for(1), 5)
+        self.assertEqual(rules.find('express', 'canarias').tiers.price_for(1), 20)
+        self.assertEqual(rules.find('express', 'baleares').tiers.price_for(1), 5)
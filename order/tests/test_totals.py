@@ -0,0 +1,64 @@
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from order import totals
+from order.models import Order, OrderItem
+
+
+class TestOrderTotals(SimpleTestCase):
+
+    def setUp(self):
+        self.order = next(o for o in Order.objects.all() if any(i.order is o for i in OrderItem.objects.all()))
+        self.items = [i for i in OrderItem.objects.all() if i.order is self.order]
+        self.saved = [(o, o.subtotal, o.total) for o in Order.objects.all()]
+        subtotal = sum((totals.line_total(i) for i in self.items), Decimal('0'))
+        self.order.subtotal = subtotal
+        self.order.total = totals.expected_total(subtotal, self.order.shipping_cost, self.order.taxes, self.order.discount)
+
+    def tearDown(self):
+        for order, subtotal, total in self.saved:
+            order.subtotal, order.total = subtotal, total
+
+    def test_model_methods_read_stored_totals(self):
+        # Pedido real sin guardar: los métodos no deben recorrer las líneas
+        order = Order(subtotal=Decimal('40.00'), shipping_cost=Decimal('4.99'), total=Decimal('44.99'))
+        self.assertEqual(order.get_total_cost(), Decimal('44.99'))
+        self.assertEqual(order.get_shipping_cost(), Decimal('4.99'))
+        self.assertEqual(OrderItem(line_total=Decimal('25.00'), price=Decimal('10.00'), quantity=2).get_cost(), Decimal('25.00'))
+        self.assertEqual(OrderItem(price=Decimal('10.00'), quantity=2).get_cost(), Decimal('20.00'))
+
+    @patch('tests.mockdb.patcher.save_orders_to_fixture')
+    def test_audit_command(self, save):
+        # Partir de pedidos cuadrados (tearDown restaura los importes)
+        call_command('audit_order_totals', '--fix', stdout=StringIO())
+        expected = self.order.total
+        self.order.total += Decimal('5')
+        out = StringIO()
+        call_command('audit_order_totals', stdout=out)
+        self.assertIn(str(self.order.order_number or self.order.id), out.getvalue())
+        self.assertIn('1 pedidos descuadrados', out.getvalue())
+        self.assertEqual(self.order.total, expected + 5)
+        save.reset_mock()
+        out = StringIO()
+        call_command('audit_order_totals', '--fix', stdout=out)
+        self.assertIn('1 pedidos corregidos', out.getvalue())
+        save.assert_called_once()
+        self.assertEqual(self.order.total, expected)
+        out = StringIO()
+        call_command('audit_order_totals', stdout=out)
+        self.assertIn('Todos los pedidos cuadran', out.getvalue())
+
+    def test_audit_reports_and_fixes_drifted_orders(self):
+        self.assertEqual(totals.audit([self.order]), [])
+        expected = self.order.total
+        self.order.total += Decimal('5')
+        [mismatch] = totals.audit([self.order])
+        self.assertEqual((mismatch.stored_total, mismatch.total), (expected + 5, expected))
+        with patch('tests.mockdb.patcher.save_orders_to_fixture') as save:
+            totals.audit([self.order], fix=True)
+        save.assert_called_once()
+        self.assertEqual(self.order.total, expected)
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, override_settings
+
+from order.models import Order, OrderItem
+from shop.inventory import ledger
+from shop.models import ProductSize
+
+
+# Sin USE_MOCKDB=1 las sesiones irían a la base de datos (motor dummy)
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+@patch('tests.mockdb.patcher.save_product_sizes_to_fixture')
+@patch('tests.mockdb.patcher.save_products_to_fixture')
+@patch('order.services.save_order_items_to_fixture')
+@patch('order.services.save_orders_to_fixture')
+class TestIdempotentOrderCreate(SimpleTestCase):
+
+    data = {
+        'first_name': 'Ana', 'last_name': 'Ruiz', 'email': 'ana@example.com', 'address': 'Calle 1',
+        'postal_code': '28001', 'city': 'Madrid', 'phone': '600000000',
+        'shipping_method': 'home', 'payment_method': 'cod',
+    }
+
+    def setUp(self):
+        cache.clear()
+        ledger.reset()
+        self.size = next(s for s in ProductSize.objects.all() if s.stock > 1)
+        self.stock = (self.size.stock, self.size.product.stock)
+        self.orders = list(Order.objects._items)
+        self.items = list(OrderItem.objects._items)
+        self.client = Client()
+        self.client.post(f'/cart/add/{self.size.product.id}/', {'quantity': 1, 'size': self.size.size})
+
+    def tearDown(self):
+        self.size.stock, self.size.product.stock = self.stock
+        Order.objects.bulk_set(self.orders)
+        OrderItem.objects.bulk_set(self.items)
+        ledger.reset()
+
+    def test_form_carries_a_fresh_key(self, *_):
+        first = self.client.get('/order/create/').context['form']['idempotency_key'].value()
+        second = self.client.get('/order/create/').context['form']['idempotency_key'].value()
+        self.assertTrue(first)
+        self.assertNotEqual(first, second)
+
+    def test_repeated_submission_returns_first_order(self, *_):
+        data = dict(self.data, idempotency_key='k' * 32)
+        first = self.client.post('/order/create/', data)
+        second = self.client.post('/order/create/', data)
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(len(Order.objects._items), len(self.orders) + 1)
+        self.assertEqual(self.size.stock, self.stock[0] - 1)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class TestShippingQuote(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        ledger.reset()
+        self.addCleanup(ledger.reset)
+        self.size = next(s for s in ProductSize.objects.all() if s.stock > 1 and s.product.price < 50)
+        self.client = Client()
+        self.client.post(f'/cart/add/{self.size.product.id}/', {'quantity': 1, 'size': self.size.size})
+
+    def quotes(self, postal_code):
+        response = self.client.get('/order/shipping-quote/', {'postal_code': postal_code})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_quotes_every_method_for_the_postal_code_zone(self):
+        data = self.quotes('07001')
+        self.assertEqual((data['zone'], data['items']), ('baleares', 1))
+        prices = {q['method']: q['price'] for q in data['quotes']}
+        self.assertEqual(prices, {'home': '7.99', 'store': '0.00'})
+        self.assertEqual(self.quotes('28001')['zone'], 'peninsula')
+
+    def test_repeated_requests_are_served_from_cache(self):
+        self.quotes('35001')
+        with patch('order.quotes.quote_methods') as quote_methods:
+            self.assertEqual(self.quotes('35 001')['zone'], 'canarias')
+        quote_methods.assert_not_called()
+        # Otro código postal o un carrito distinto se vuelven a calcular
+        self.assertEqual(self.quotes('52001')['zone'], 'ceuta_melilla')
+        self.client.post(f'/cart/add/{self.size.product.id}/', {'quantity': 1, 'size': self.size.size})
+        self.assertEqual(self.quotes('52001')['items'], 2)
+
+    def test_only_get_is_allowed(self):
+        self.assertEqual(self.client.post('/order/shipping-quote/').status_code, 405)
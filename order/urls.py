@@ -5,6 +5,8 @@ app_name = 'order'
 
 urlpatterns = [
     path('create/', views.order_create, name='order_create'),
+    path('shipping-quote/', views.shipping_quote, name='shipping_quote'),
+    path('payment/client-token/', views.payment_client_token, name='payment_client_token'),
     path('payment/<int:order_id>/', views.payment_process, name='payment_process'),
     path('created/<int:order_id>/', views.order_created, name='order_created'),
 ]
\ No newline at end of file
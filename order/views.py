@@ -1,33 +1,41 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.urls import reverse
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from cart.cart import Cart
-from .models import Order, OrderItem
+from shop.inventory import InsufficientStock
+from .models import Order
 from .forms import OrderCreateForm
-from .shipping import compute_shipping, method_name
-from decimal import Decimal
-import uuid
-from .shipping import compute_shipping
-import braintree
-from config.braintreeSettings import BRAINTREE_CONF
+from . import idempotency, outbox, payments, quotes
+from .services import place_order
 import os
 from django.core.exceptions import ImproperlyConfigured
 
 # Importar funciones de persistencia para MockDB
 try:
-    from tests.mockdb.patcher import save_orders_to_fixture, save_order_items_to_fixture
+    from tests.mockdb.patcher import save_orders_to_fixture
 except Exception:
     def save_orders_to_fixture():
         pass
-    def save_order_items_to_fixture():
-        pass
 
 def _mockdb_active():
     return os.environ.get('USE_MOCKDB') == '1' or getattr(settings, 'USE_MOCKDB', False)
 
-def _generate_order_number(next_id: int) -> str:
-    return f"MOCK-{next_id:04d}"
+def _get_order(order_id):
+    """Pedido por id; con MockDB devuelve None si no existe (con el ORM, 404)."""
+    if not _mockdb_active():
+        return get_object_or_404(Order, id=order_id)
+    # Evitar acceso ORM cuando estamos en MockDB
+    try:
+        return Order.objects.get(id=order_id)
+    except Exception:
+        items = getattr(Order.objects, '_items', [])
+        try:
+            oid = int(order_id)
+        except Exception:
+            oid = order_id
+        return next((o for o in items if int(getattr(o, 'id', 0) or 0) == oid), None)
 
 def order_create(request):
     cart = Cart(request)
@@ -48,6 +56,10 @@ def order_create(request):
     
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
+        snapshot = cart.snapshot()
+        if not snapshot.is_valid:
+            # El carrito muestra qué líneas superan el stock disponible
+            return redirect('cart:cart_detail')
         if form.is_valid():
             cd = form.cleaned_data
             
@@ -65,146 +77,81 @@ def order_create(request):
                 except Exception as e:
                     print(f"⚠️ No se pudo obtener Customer con id {customer_id}: {e}")
             
-            # No forzar id: el FakeManager asigna un id único evitando duplicados
-            next_generated_id = getattr(Order.objects, '_next_id', 1)
-            
-            # Crear el pedido en memoria
-            order = Order.objects.create(
-                first_name=cd['first_name'],
-                last_name=cd['last_name'],
-                email=cd['email'],
-                address=cd['address'],
-                postal_code=cd['postal_code'],
-                city=cd['city'],
-                order_number=_generate_order_number(next_generated_id),
-                status='pending',
-                subtotal=str('0'),
-                shipping_cost=str('0'),
-                shipping_method=cd.get('shipping_method') or 'home',
-                taxes='0',
-                discount='0',
-                total=str('0'),
-                paid=False,
-                payment_method=cd.get('payment_method') or '',
-                phone=cd.get('phone') or '',
-                customer=customer_obj,  # Asignar el objeto Customer directamente
-            )
-            
-            # Calculate totals
-            subtotal = Decimal('0.00')
-            for item in cart:
-                subtotal += Decimal(str(item['price'])) * item['quantity']
+            # Un envío repetido del mismo formulario recibe la redirección del primero
+            key = cd.get('idempotency_key')
+            if key and not idempotency.claim(key):
+                return redirect(idempotency.result(key) or 'cart:cart_detail')
             
-            shipping_cost = Decimal(str(compute_shipping(float(subtotal), order.shipping_method)))
-            
-            order.subtotal = subtotal
-            order.shipping_cost = shipping_cost
-            order.total = subtotal + shipping_cost
-            order.save()
-            
-            # Create order items
-            for item in cart:
-                product = item['product']
-                if product:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        price=item['price'],
-                        quantity=item['quantity'],
-                        size=item.get('size')
-                    )
-            
-            # Persistir en JSON (MockDB)
-            if _mockdb_active():
-                try:
-                    save_orders_to_fixture()
-                    save_order_items_to_fixture()
-                    print(f"✅ Pedido {order.order_number} guardado correctamente en JSON")
-                except Exception as e:
-                    print(f"❌ Error al persistir pedido: {e}")
+            # Stock, pedido y líneas en una sola operación (ver order/services.py)
+            try:
+                order = place_order(cart, snapshot, cd, customer=customer_obj)
+            except InsufficientStock:
+                if key:
+                    idempotency.release(key)
+                return redirect('cart:cart_detail')
+            except Exception:
+                if key:
+                    idempotency.release(key)
+                raise
             
             cart.clear()
             
-            # If no payment required, go directly to confirmation
-            if not order.is_payment_required():
-                order.paid = True
-                order.status = 'paid'  # Actualizar estado
-                order.save()
-                
-                # Persistir cambio de estado en JSON (MockDB)
-                if _mockdb_active():
-                    try:
-                        save_orders_to_fixture()
-                        print(f"✅ Pedido {order.order_number} marcado como pagado (sin pago requerido)")
-                    except Exception as e:
-                        print(f"❌ Error al persistir estado: {e}")
-                
-                return redirect('order:order_created', order.id)
-            
-            # Otherwise go to payment
-            return redirect('order:payment_process', order.id)
+            # If no payment required, go directly to confirmation,
+            # otherwise go to payment
+            if order.paid:
+                url = reverse('order:order_created', args=[order.id])
+            else:
+                # El token del Drop-in se pide mientras el navegador sigue la redirección
+                payments.client_tokens.prefetch()
+                url = reverse('order:payment_process', args=[order.id])
+            if key:
+                idempotency.complete(key, url)
+            return redirect(url)
     else:
-        form = OrderCreateForm(initial=initial_data)
+        form = OrderCreateForm(initial=dict(initial_data, idempotency_key=idempotency.new_key()))
     return render(request, 'order/create.html', {'cart': cart, 'form': form})
 
-def _get_braintree_gateway():
-    """
-    Lazily build and validate a Braintree gateway. Prefer settings.BRAINTREE_CONF,
-    then fall back to the imported BRAINTREE_CONF. Raise ImproperlyConfigured if
-    credentials are missing.
-    """
-    conf = getattr(settings, 'BRAINTREE_CONF', None) or globals().get('BRAINTREE_CONF', None)
-    if not conf:
-        raise ImproperlyConfigured(
-            "BRAINTREE_CONF not found. Define settings.BRAINTREE_CONF or set config.braintreeSettings.BRAINTREE_CONF."
-        )
-    merchant = getattr(conf, 'merchant_id', None)
-    public = getattr(conf, 'public_key', None)
-    private = getattr(conf, 'private_key', None)
-    if not merchant or not public or not private:
-        raise ImproperlyConfigured(
-            "BRAINTREE_CONF missing credentials (merchant_id/public_key/private_key). "
-            "Set BRAINTREE_MERCHANT_ID, BRAINTREE_PUBLIC_KEY and BRAINTREE_PRIVATE_KEY."
-        )
-    return braintree.BraintreeGateway(conf)
+@require_GET
+def shipping_quote(request):
+    """Coste de envío de cada método para el carrito actual y el código postal indicado."""
+    return JsonResponse(quotes.for_cart(Cart(request), request.GET.get('postal_code', '')))
+
+@require_GET
+def payment_client_token(request):
+    """Token del Drop-in para las páginas de pago que se sirvieron sin él."""
+    try:
+        payments.get_gateway()
+    except ImproperlyConfigured as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
+    token = payments.client_tokens.get(
+        wait=getattr(settings, 'BRAINTREE_CLIENT_TOKEN_WAIT', 10)
+    )
+    if not token:
+        return JsonResponse({'success': False, 'error': 'La pasarela de pago no responde. Inténtalo de nuevo.'}, status=503)
+    return JsonResponse({'success': True, 'client_token': token})
 
 
 def payment_process(request, order_id):
-    # get order (works with mockdb)
-    if _mockdb_active():
-        try:
-            order = Order.objects.get(id=order_id)
-        except Exception:
-            items = getattr(Order.objects, '_items', [])
-            try:
-                oid = int(order_id)
-            except Exception:
-                oid = order_id
-            order = next((o for o in items if int(getattr(o, 'id', 0) or 0) == oid), None)
-            if not order:
-                return render(request, 'order/payment.html', {'error': 'Pedido no encontrado (MockDB).'})
-    else:
-        order = get_object_or_404(Order, id=order_id)
+    order = _get_order(order_id)
+    if not order:
+        return render(request, 'order/payment.html', {'error': 'Pedido no encontrado (MockDB).'})
 
-    # try to create gateway (render friendly error if config is missing)
+    # shared gateway (render friendly error if config is missing)
     try:
-        gateway = _get_braintree_gateway()
+        gateway = payments.get_gateway()
     except ImproperlyConfigured as e:
-        return render(request, 'order/payment.html', {'order': order, 'error': str(e), 'client_token': None})
+        return render(request, 'order/payment.html', {'order': order, 'error': str(e), 'client_token': None,
+                                                      'gateway': payments.gateway_name()})
 
     if request.method == 'POST':
         nonce = request.POST.get('payment_method_nonce')
-        result = gateway.transaction.sale({
-            'amount': str(order.get_total_cost()),
-            'payment_method_nonce': nonce,
-            'options': {'submit_for_settlement': True}
-        })
+        result = gateway.sale(order.get_total_cost(), nonce)
 
-        if result.is_success:
+        if result.success:
             order.paid = True
             order.status = 'paid'  # Actualizar estado a pagado
-            if getattr(result, 'transaction', None) and getattr(result.transaction, 'id', None):
-                order.braintree_id = result.transaction.id
+            if result.transaction_id:
+                order.braintree_id = result.transaction_id
             order.save()
             
             # Persistir en JSON (MockDB)
@@ -217,93 +164,23 @@ def payment_process(request, order_id):
             
             return redirect('order:order_created', order.id)
         else:
-            client_token = None
-            try:
-                client_token = gateway.client_token.generate()
-            except Exception:
-                pass
             return render(request, 'order/payment.html', {
                 'order': order,
                 'error': result.message,
-                'client_token': client_token
+                'client_token': payments.client_tokens.get(),
+                'gateway': gateway.name,
             })
     else:
-        client_token = None
-        try:
-            client_token = gateway.client_token.generate()
-        except Exception:
-            pass
-        return render(request, 'order/payment.html', {'order': order, 'client_token': client_token})
+        # Sin esperar a Braintree: si aún no hay token el navegador lo pide después
+        return render(request, 'order/payment.html', {'order': order, 'client_token': payments.client_tokens.get(),
+                                                      'gateway': gateway.name})
 
 def order_created(request, order_id):
-    if os.environ.get('USE_MOCKDB') == '1' or getattr(settings, 'USE_MOCKDB', False):
-        # Evitar acceso ORM cuando estamos en MockDB
-        try:
-            order = Order.objects.get(id=order_id)
-        except Exception:
-            items = getattr(Order.objects, '_items', [])
-            try:
-                oid = int(order_id)
-            except Exception:
-                oid = order_id
-            order = next((o for o in items if int(getattr(o, 'id', 0) or 0) == oid), None)
-            if not order:
-                return redirect('shop:product_list')
-    else:
-        order = get_object_or_404(Order, id=order_id)
-    
-    # Enviar correo de confirmación
-    _send_order_confirmation_email(order)
+    order = _get_order(order_id)
+    if not order:
+        return redirect('shop:product_list')
+
+    # El correo de confirmación se envía en segundo plano (ver order/outbox.py)
+    outbox.enqueue_confirmation(order)
     
     return render(request, 'order/created.html', {'order': order})
-
-def _send_order_confirmation_email(order):
-    """Envía correo de confirmación del pedido al cliente."""
-    try:
-        import smtplib
-        import ssl
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        
-        subject = f'Confirmación de Pedido #{order.order_number} - Nexo Shoes'
-        
-        # Renderizar plantillas
-        html_message = render_to_string('emails/confirmation.html', {'order': order})
-        text_message = render_to_string('emails/confirmation.txt', {'order': order})
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=text_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[order.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            print(f"Correo enviado a {order.email}")
-        except TypeError as e:
-            # Si falla por el error de keyfile, usar SMTP directamente
-            if 'keyfile' in str(e):
-                print("Usando envío SMTP directo (fix para Python 3.12+)")
-                
-                msg = MIMEMultipart('alternative')
-                msg['Subject'] = subject
-                msg['From'] = settings.EMAIL_HOST_USER
-                msg['To'] = order.email
-                
-                part1 = MIMEText(text_message, 'plain', 'utf-8')
-                part2 = MIMEText(html_message, 'html', 'utf-8')
-                msg.attach(part1)
-                msg.attach(part2)
-                
-                context = ssl.create_default_context()
-                with smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
-                    server.starttls(context=context)
-                    server.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-                    server.send_message(msg)
-                
-                print(f"Correo enviado a {order.email}")
-            else:
-                raise
-    except Exception as e:
-        print(f"Error al enviar correo: {e}")
\ No newline at end of file
@@ -6,6 +6,8 @@ class ShopConfig(AppConfig):
     name = 'shop'
 
     def ready(self):
+        from . import signals  # noqa: F401  (invalida la caché del catálogo)
+
         # Activar MockDB si:
         #  - USE_MOCKDB=1 (flag explícito) O
         #  - La BD usa el motor dummy (sin conexión real)
@@ -0,0 +1,210 @@
+"""Caché de respuestas del catálogo con invalidación por versión.
+
+Cada escritura del catálogo (admin-lite, persistencia de MockDB o señales del
+ORM) incrementa un número de versión global guardado en la caché. La versión
+forma parte de la clave de cada página, así que una escritura deja obsoletas
+todas las páginas de golpe sin tener que borrarlas una a una.
+
+Las mismas versiones alimentan los ETag de las peticiones condicionales, de
+modo que un navegador o proxy con la página al día recibe un 304 sin que se
+llegue a renderizar la plantilla.
+
+Las partes que dependen del visitante (el contador del carrito) se guardan
+como un marcador estilo ESI y se rellenan al servir cada respuesta, así que
+la misma página cacheada vale para cualquier visitante anónimo.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from functools import wraps
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+CATALOG_VERSION_KEY = 'shop:catalog_version'
+STOCK_VERSION_KEY = 'shop:stock_version'
+PAGE_KEY_PREFIX = 'shop:page'
+DEFAULT_PAGE_TIMEOUT = 60 * 15
+
+CART_BADGE_PLACEHOLDER = '<!--shop:cart-badge-->'
+
+_CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _get_version(key: str) -> int:
+    """Lee un contador de versión.
+
+    Si la clave no existe (caché vacía o expulsada) se inicializa con la hora
+    en milisegundos: nunca coincide con una versión anterior, por lo que una
+    expulsión no puede resucitar páginas obsoletas.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return int(version)
+
+
+def _bump_version(key: str) -> int:
+    try:
+        version = int(cache.incr(key))
+        # incr() en FileBasedCache reescribe la entrada con el timeout por
+        # defecto (300 s); sin esto la versión caducaría y se resembraría
+        # tirando todas las páginas. touch() no reescribe el valor, así que
+        # no puede deshacer un incr() concurrente.
+        cache.touch(key, None)
+        return version
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def catalog_version() -> int:
+    """Versión vigente del catálogo (productos, categorías, marcas)."""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> int:
+    """Invalida todas las páginas cacheadas del catálogo."""
+    return _bump_version(CATALOG_VERSION_KEY)
+
+
+def stock_version() -> int:
+    """Versión del stock por talla; cambia más a menudo que el catálogo."""
+    return _get_version(STOCK_VERSION_KEY)
+
+
+def bump_stock_version() -> int:
+    return _bump_version(STOCK_VERSION_KEY)
+
+
+def normalised_query(request) -> List[Tuple[str, str]]:
+    """Parámetros ordenados y sin valores vacíos ni marcas de campaña (utm_*)."""
+    return sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        if not key.startswith('utm_')
+        for value in values
+        if value != ''
+    )
+
+
+def _digest(*parts) -> str:
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def page_cache_key(request, version: int = None) -> str:
+    if version is None:
+        version = catalog_version()
+    return f"{PAGE_KEY_PREFIX}:{version}:{stock_version()}:{_digest(request.path, normalised_query(request))}"
+
+
+def listing_etag(request, *args, **kwargs) -> str:
+    """ETag fuerte de un listado: ruta, query normalizada y versiones."""
+    return _digest(request.path, normalised_query(request), catalog_version(), stock_version())
+
+
+def is_cacheable_request(request) -> bool:
+    """Solo visitantes anónimos sin mensajes pendientes (el carrito va en un hueco)."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    session = getattr(request, 'session', None)
+    if session is not None:
+        if session.get('mock_user') or session.get('mock_user_role'):
+            return False
+        if session.get('_messages'):
+            return False
+    return 'messages' not in request.COOKIES
+
+
+def _refresh_csrf(content: bytes, request) -> bytes:
+    """Sustituye los tokens CSRF de la página cacheada por uno del visitante actual."""
+    if b'csrfmiddlewaretoken' not in content:
+        return content
+    token = get_token(request).encode('ascii')
+    return _CSRF_INPUT_RE.sub(lambda m: m.group(1) + token + m.group(2), content)
+
+
+def cart_badge(request) -> str:
+    """Unidades en el carrito del visitante, leídas directamente de la sesión."""
+    from cart.cart import count_units
+    session = getattr(request, 'session', None)
+    return str(count_units(session.get(settings.CART_SESSION_ID) if session is not None else None))
+
+
+def _fill_holes(content: bytes, request) -> bytes:
+    """Sustituye los marcadores de la página cacheada por los datos del visitante."""
+    placeholder = CART_BADGE_PLACEHOLDER.encode('ascii')
+    if placeholder in content:
+        content = content.replace(placeholder, cart_badge(request).encode('ascii'))
+    return _refresh_csrf(content, request)
+
+
+def cache_catalog_page(view_func):
+    """Sirve la vista desde la caché para visitantes anónimos.
+
+    La clave combina la ruta, la query string normalizada y la versión del
+    catálogo. Solo se guardan respuestas 200 que no fijan cookies propias; la
+    vista se renderiza con los huecos sin rellenar (``request.punch_holes``).
+    """
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(_fill_holes(content, request), content_type=content_type)
+        request.punch_holes = True
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if not response.cookies:
+                timeout = getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', DEFAULT_PAGE_TIMEOUT)
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            response.content = _fill_holes(response.content, request)
+        return response
+    return _wrapped
+
+
+def conditional_catalog_page(etag_func=None, last_modified_func=None):
+    """Añade ETag/Last-Modified y responde 304 sin ejecutar la vista.
+
+    Solo se aplica a peticiones cacheables (anónimas): las páginas
+    personalizadas no comparten validadores. El contador del carrito entra en
+    el ETag porque se rellena en la página. Las respuestas llevan
+    ``Cache-Control: no-cache`` para que el navegador revalide en cada visita.
+    """
+    def _visitor_etag(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs)
+        if etag is None:
+            return None
+        return f"{etag}-c{cart_badge(request)}"
+
+    def decorator(view_func):
+        conditional_view = condition(
+            etag_func=_visitor_etag if etag_func else None,
+            last_modified_func=last_modified_func,
+        )(view_func)
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, no_cache=True)
+            return response
+        return _wrapped
+    return decorator
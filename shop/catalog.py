@@ -0,0 +1,321 @@
+"""Índice en memoria del catálogo público.
+
+El índice se construye con una sola lectura de los productos disponibles y se
+reutiliza entre peticiones mientras el catálogo no cambie; si solo cambia el
+stock (un pedido), se actualiza el de cada producto en su sitio. Funciona igual con
+MockDB (managers en memoria) que con el ORM.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import catalog_version, stock_version
+from .models import Product, ProductSize
+
+# Órdenes disponibles en ?sort= (valor, etiqueta)
+SORT_CHOICES = [
+    ('name', 'Nombre'),
+    ('price', 'Precio: menor a mayor'),
+    ('-price', 'Precio: mayor a menor'),
+    ('newest', 'Novedades'),
+    ('popular', 'Más vendidos'),
+    ('discount', 'Mayor descuento'),
+]
+DEFAULT_SORT = 'name'
+
+
+@dataclass
+class SortOrder:
+    """Orden precalculado: claves (clave, id) ascendentes y posición de cada id."""
+    name: str
+    keys: List[Tuple[Any, int]]
+    ids: List[int] = field(default_factory=list)
+    positions: Dict[int, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.ids = [pk for _, pk in self.keys]
+        self.positions = {pk: i for i, pk in enumerate(self.ids)}
+
+
+def _decimal(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value or 0))
+    except (InvalidOperation, ValueError):
+        return Decimal('0')
+
+
+def _cents(value: Decimal) -> int:
+    return int((value * 100).quantize(Decimal('1')))
+
+
+def effective_price(p: Any) -> Decimal:
+    """Precio que paga el cliente: el de oferta si existe y es menor que el normal."""
+    price = _decimal(getattr(p, 'price', 0))
+    offer = _decimal(getattr(p, 'offer_price', 0))
+    return offer if 0 < offer < price else price
+
+
+def _name_key(p: Any) -> str:
+    return getattr(p, 'name', '') or ''
+
+
+def _newest_key(p: Any) -> float:
+    created = getattr(p, 'created', None)
+    if created is not None and hasattr(created, 'timestamp'):
+        return -created.timestamp()
+    # Los productos de MockDB no tienen fecha: el id más alto es el más reciente
+    return -float(p.id)
+
+
+def _discount_key(p: Any) -> int:
+    return -_cents(_decimal(getattr(p, 'price', 0)) - effective_price(p))
+
+
+def _sales_signature() -> Tuple[Any, ...]:
+    from order.models import OrderItem
+    items = getattr(OrderItem.objects, '_items', None)
+    if items is not None:
+        return ('mock', id(items), len(items))
+    from django.db.models import Count, Max
+    agg = OrderItem.objects.aggregate(n=Count('id'), last=Max('id'))
+    return ('orm', agg['n'], agg['last'])
+
+
+def _stock_signature() -> Tuple[Any, ...]:
+    """Huella de las tallas: cambia al editar tallas o al variar su stock."""
+    items = getattr(ProductSize.objects, '_items', None)
+    if items is not None:
+        return ('mock', id(items), len(items), sum(int(getattr(s, 'stock', 0) or 0) for s in items))
+    from django.db.models import Count, Sum
+    agg = ProductSize.objects.aggregate(n=Count('id'), units=Sum('stock'))
+    return ('orm', agg['n'], agg['units'])
+
+
+def _sizes_in_stock() -> Iterable[Tuple[int, str]]:
+    """Pares (product_id, talla) con stock > 0, en una sola consulta."""
+    mgr = ProductSize.objects
+    if hasattr(mgr, '_items'):
+        return [
+            (s.product.id, str(s.size)) for s in mgr.all()
+            if int(getattr(s, 'stock', 0) or 0) > 0 and getattr(s, 'product', None) is not None
+        ]
+    return mgr.filter(stock__gt=0).values_list('product_id', 'size')
+
+
+def _product_stock() -> Iterable[Tuple[int, int]]:
+    """Pares (product_id, stock) de todos los productos, en una sola consulta."""
+    mgr = Product.objects
+    if hasattr(mgr, '_items'):
+        return [(p.id, int(getattr(p, 'stock', 0) or 0)) for p in mgr.all()]
+    return mgr.values_list('id', 'stock')
+
+
+def _size_sort_key(size: str) -> Tuple[int, Any]:
+    try:
+        return (0, float(size.replace(',', '.')))
+    except ValueError:
+        return (1, size)
+
+
+def _posting(products: List[Any], attr) -> Dict[Any, Set[int]]:
+    postings: Dict[Any, Set[int]] = {}
+    for p in products:
+        value = attr(p)
+        if value not in (None, ''):
+            postings.setdefault(value, set()).add(p.id)
+    return postings
+
+
+def _union(postings: Dict[Any, Set[int]], values: Iterable[Any]) -> Set[int]:
+    result: Set[int] = set()
+    for value in values:
+        result |= postings.get(value, set())
+    return result
+
+
+def _units_sold() -> Dict[int, int]:
+    """Unidades vendidas por producto a partir de las líneas de pedido."""
+    from order.models import OrderItem
+    mgr = OrderItem.objects
+    if hasattr(mgr, '_items'):
+        sold: Dict[int, int] = {}
+        for item in mgr.all():
+            pid = getattr(getattr(item, 'product', None), 'id', None)
+            if pid is not None:
+                sold[pid] = sold.get(pid, 0) + int(getattr(item, 'quantity', 0) or 0)
+        return sold
+    from django.db.models import Sum
+    rows = mgr.values('product_id').annotate(units=Sum('quantity'))
+    return {r['product_id']: int(r['units'] or 0) for r in rows}
+
+
+class CatalogIndex:
+    """Productos disponibles indexados por id, con órdenes y facetas precalculados."""
+
+    def __init__(self, products: List[Any], signature: Any = None, stock: Any = None):
+        self.signature = signature
+        self.stock = stock
+        self.products: Dict[int, Any] = {p.id: p for p in products}
+        self.orders: Dict[str, SortOrder] = {
+            'name': SortOrder('name', sorted((_name_key(p), p.id) for p in products)),
+            'price': SortOrder('price', sorted((_cents(effective_price(p)), p.id) for p in products)),
+            '-price': SortOrder('-price', sorted((-_cents(effective_price(p)), p.id) for p in products)),
+            'newest': SortOrder('newest', sorted((_newest_key(p), p.id) for p in products)),
+            'discount': SortOrder('discount', sorted((_discount_key(p), p.id) for p in products)),
+        }
+        self._sales_signature: Any = None
+        # Listas invertidas valor -> ids para intersectar filtros sin recorrer productos
+        self.by_category = _posting(products, lambda p: getattr(getattr(p, 'category', None), 'id', None))
+        self.by_brand = _posting(products, lambda p: getattr(getattr(p, 'brand', None), 'name', None))
+        self.by_color = _posting(products, lambda p: getattr(p, 'color', ''))
+        self.by_material = _posting(products, lambda p: getattr(p, 'material', ''))
+        self.brands = sorted(self.by_brand)
+        self.colors = sorted(self.by_color)
+        self.materials = sorted(self.by_material)
+        self._stock_signature: Any = None
+        self._by_size: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def order(self, name: str) -> SortOrder:
+        if name == 'popular':
+            return self._popular_order()
+        return self.orders.get(name) or self.orders[DEFAULT_SORT]
+
+    def refresh_stock(self, stock: Any) -> None:
+        """Actualiza en su sitio el stock de los productos que lo cambiaron.
+
+        Un pedido solo cambia la versión de stock: no hace falta reconstruir
+        órdenes ni facetas, y las tallas se recalculan en ``size_postings``.
+        """
+        for pid, units in _product_stock():
+            product = self.products.get(pid)
+            if product is not None and getattr(product, 'stock', None) != units:
+                product.stock = units
+        self.stock = stock
+
+    def size_postings(self) -> Dict[str, Set[int]]:
+        """talla -> ids con stock en esa talla; se recalcula solo si cambian las tallas."""
+        signature = _stock_signature()
+        if self._stock_signature != signature:
+            by_size: Dict[str, Set[int]] = {}
+            for pid, size in _sizes_in_stock():
+                if pid in self.products:
+                    by_size.setdefault(str(size), set()).add(pid)
+            self._by_size = by_size
+            self._stock_signature = signature
+        return self._by_size
+
+    @property
+    def sizes(self) -> List[str]:
+        return sorted(self.size_postings(), key=_size_sort_key)
+
+    def price_range(self, min_price: Optional[Decimal] = None, max_price: Optional[Decimal] = None) -> Set[int]:
+        """Ids con precio efectivo en [min_price, max_price] por bisección del orden por precio."""
+        keys = self.orders['price'].keys
+        lo = bisect_left(keys, (_cents(min_price),)) if min_price is not None else 0
+        hi = bisect_right(keys, (_cents(max_price), float('inf'))) if max_price is not None else len(keys)
+        return set(self.orders['price'].ids[lo:hi])
+
+    def filter_ids(self, category_id: Optional[int] = None, brands: Iterable[str] = (),
+                   colors: Iterable[str] = (), materials: Iterable[str] = (),
+                   sizes: Iterable[str] = (), min_price: Optional[Decimal] = None,
+                   max_price: Optional[Decimal] = None) -> Optional[Set[int]]:
+        """Intersección de todos los filtros activos (None si no hay ninguno).
+
+        Dentro de un mismo filtro los valores se combinan con OR; entre filtros, con AND.
+        """
+        sets: List[Set[int]] = []
+        if category_id is not None:
+            sets.append(self.by_category.get(category_id, set()))
+        brands = list(brands)
+        if brands:
+            matched = _union(self.by_brand, brands)
+            # Marcas desconocidas se ignoran, como hacía el filtro por Brand
+            if matched:
+                sets.append(matched)
+        for postings, values in ((self.by_color, colors), (self.by_material, materials)):
+            values = list(values)
+            if values:
+                sets.append(_union(postings, values))
+        sizes = list(sizes)
+        if sizes:
+            sets.append(_union(self.size_postings(), sizes))
+        if min_price is not None or max_price is not None:
+            sets.append(self.price_range(min_price, max_price))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def _popular_order(self) -> SortOrder:
+        """Orden por unidades vendidas; solo se recalcula cuando cambian las líneas de pedido."""
+        signature = _sales_signature()
+        order = self.orders.get('popular')
+        if order is None or self._sales_signature != signature:
+            sold = _units_sold()
+            order = SortOrder('popular', sorted((-sold.get(pk, 0), pk) for pk in self.products))
+            self.orders['popular'] = order
+            self._sales_signature = signature
+        return order
+
+
+_lock = threading.Lock()
+_index: Optional[CatalogIndex] = None
+
+
+def _signature() -> Tuple[Any, ...]:
+    """Huella barata del catálogo para detectar cambios.
+
+    Incluye la versión global del catálogo (ver shop/cache.py). Además, en
+    MockDB el admin-lite recarga los managers tras cada escritura, así que se
+    añade la identidad del manager y de su lista; con el ORM, una consulta
+    agregada cubre escrituras que no disparan señales (update() masivos).
+    """
+    version = catalog_version()
+    mgr = Product.objects
+    items = getattr(mgr, '_items', None)
+    if items is not None:
+        return ('mock', version, id(mgr), id(items), len(items))
+    from django.db.models import Count, Max
+    agg = Product.objects.aggregate(n=Count('id'), last=Max('updated'))
+    return ('orm', version, agg['n'], agg['last'])
+
+
+def _load_products() -> List[Any]:
+    qs = Product.objects.filter(available=True)
+    if hasattr(qs, 'select_related'):
+        qs = qs.select_related('brand', 'category')
+    return list(qs)
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Devuelve el índice vigente, reconstruyéndolo solo si el catálogo cambió."""
+    global _index
+    signature = _signature()
+    stock = stock_version()
+    index = _index
+    if index is not None and index.signature == signature and index.stock == stock:
+        return index
+    with _lock:
+        if _index is not None and _index.signature == signature:
+            if _index.stock != stock:
+                _index.refresh_stock(stock)
+        else:
+            index = CatalogIndex(_load_products(), signature, stock)
+            # Mantener vivos manager y lista evita que id() se reutilice mientras el índice exista
+            index._source = (Product.objects, getattr(Product.objects, '_items', None))
+            _index = index
+        return _index
+
+
+def reset_catalog_index() -> None:
+    """Descarta el índice (útil en tests)."""
+    global _index
+    with _lock:
+        _index = None
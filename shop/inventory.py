@@ -0,0 +1,334 @@
+"""Reservas de stock con caducidad.
+
+Cada carrito (``holder``) reserva las unidades de sus líneas durante
+``STOCK_RESERVATION_TTL`` segundos; otros compradores solo ven el stock que
+queda libre. Al confirmar el pedido las reservas se convierten en un
+descuento atómico del stock (``UPDATE`` condicionales con ``F()`` en la
+transacción del pedido con el ORM, compare-and-swap bajo el cerrojo del
+ledger con MockDB). Las reservas caducadas se liberan de forma
+perezosa como mucho cada ``STOCK_SWEEP_INTERVAL`` segundos.
+
+El stock disponible se responde desde contadores en memoria, que se recargan
+con una sola lectura cuando cambia la versión de stock (ver shop/cache.py).
+Las reservas viven en el proceso: con varios workers cada uno ve las suyas,
+pero el descuento final siempre se valida contra la base de datos.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .cache import bump_stock_version, catalog_version, stock_version
+from .models import Product, ProductSize
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_SWEEP_INTERVAL = 60
+
+# (product_id, talla) ; talla None = stock del producto sin tallas
+StockKey = Tuple[int, Optional[str]]
+
+
+class InsufficientStock(Exception):
+    """Alguna línea pide más unidades de las disponibles."""
+
+    def __init__(self, shortages: List[Tuple[StockKey, int, int]]):
+        self.shortages = shortages  # [(clave, pedidas, disponibles)]
+        detail = ', '.join(
+            f"producto {pid}{f' talla {size}' if size else ''}: {available} disponibles"
+            for (pid, size), _, available in shortages
+        )
+        super().__init__(f"Stock insuficiente ({detail})")
+
+
+@dataclass
+class Reservation:
+    quantity: int
+    expires_at: float
+
+
+def _ttl() -> int:
+    return getattr(settings, 'STOCK_RESERVATION_TTL', DEFAULT_TTL)
+
+
+def _load_stock() -> Tuple[Dict[StockKey, int], Set[int]]:
+    """Stock por talla y por producto, una lectura de cada tabla."""
+    size_mgr, product_mgr = ProductSize.objects, Product.objects
+    if hasattr(size_mgr, '_items'):
+        sizes = [(s.product.id, s.size, s.stock) for s in size_mgr.all() if getattr(s, 'product', None) is not None]
+    else:
+        sizes = size_mgr.values_list('product_id', 'size', 'stock')
+    if hasattr(product_mgr, '_items'):
+        products = [(p.id, p.stock) for p in product_mgr.all()]
+    else:
+        products = product_mgr.values_list('id', 'stock')
+    on_hand: Dict[StockKey, int] = {}
+    sized: Set[int] = set()
+    for pid, size, stock in sizes:
+        on_hand[(pid, str(size))] = int(stock or 0)
+        sized.add(pid)
+    for pid, stock in products:
+        on_hand[(pid, None)] = int(stock or 0)
+    return on_hand, sized
+
+
+class StockLedger:
+    """Stock disponible y reservas por carrito, protegidos por un cerrojo."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._version = None
+        self._on_hand: Dict[StockKey, int] = {}
+        self._sized: Set[int] = set()
+        self._holds: Dict[str, Dict[StockKey, Reservation]] = {}
+        self._reserved: Dict[StockKey, int] = {}
+        self._last_sweep = 0.0
+
+    def reset(self) -> None:
+        """Olvida contadores y reservas (útil en tests)."""
+        with self.lock:
+            self._version = None
+            self._holds.clear()
+            self._reserved.clear()
+
+    # -- estado -------------------------------------------------------------
+
+    def _current_version(self):
+        return (stock_version(), catalog_version())
+
+    def _refresh(self) -> None:
+        version = self._current_version()
+        if version != self._version:
+            self._on_hand, self._sized = _load_stock()
+            self._version = version
+
+    def resolve(self, product_id, size) -> Optional[StockKey]:
+        """Clave de stock de una línea; None si la talla ya no existe."""
+        pid = int(product_id)
+        if size and (pid, str(size)) in self._on_hand:
+            return (pid, str(size))
+        if pid in self._sized:
+            return None
+        return (pid, None)
+
+    def _free(self, key: Optional[StockKey], holder: Optional[str]) -> int:
+        if key is None:
+            return 0
+        own = self._holds.get(holder, {}).get(key) if holder else None
+        return self._on_hand.get(key, 0) - self._reserved.get(key, 0) + (own.quantity if own else 0)
+
+    def _drop(self, holder: str, key: StockKey) -> None:
+        hold = self._holds.get(holder, {}).pop(key, None)
+        if hold is not None:
+            self._reserved[key] = self._reserved.get(key, 0) - hold.quantity
+            if self._reserved[key] <= 0:
+                del self._reserved[key]
+        if holder in self._holds and not self._holds[holder]:
+            del self._holds[holder]
+
+    # -- API ----------------------------------------------------------------
+
+    def available(self, product_id, size=None, holder: Optional[str] = None) -> int:
+        """Unidades que ``holder`` puede tener en su carrito (incluye lo que ya reservó)."""
+        with self.lock:
+            self._refresh()
+            self.sweep()
+            return max(0, self._free(self.resolve(product_id, size), holder))
+
+    def reserve_cart(self, holder: str, lines: Iterable[Tuple[int, Optional[str], int]],
+                     strict: bool = True) -> None:
+        """Ajusta las reservas de ``holder`` a las líneas de su carrito.
+
+        Solo se comprueban las líneas que piden más que lo ya reservado; si
+        alguna no cabe no se toca ninguna reserva y se lanza InsufficientStock.
+        Con ``strict=False`` (quitar líneas, fusionar carritos) nunca falla:
+        se reserva lo que quede libre.
+        """
+        with self.lock:
+            self._refresh()
+            self.sweep()
+            wanted: Dict[StockKey, int] = {}
+            shortages = []
+            for product_id, size, quantity in lines:
+                key = self.resolve(product_id, size)
+                if key is None:
+                    # Talla que ya no existe: no se reserva; la valoración del carrito la marca
+                    continue
+                wanted[key] = wanted.get(key, 0) + int(quantity)
+            current = self._holds.get(holder, {})
+            for key, quantity in wanted.items():
+                held = current[key].quantity if key in current else 0
+                free = max(0, self._free(key, holder))
+                if quantity > held and quantity > free:
+                    if strict:
+                        shortages.append((key, quantity, free))
+                    else:
+                        wanted[key] = max(held, free)
+            if shortages:
+                raise InsufficientStock(shortages)
+
+            expires_at = time.time() + _ttl()
+            for key in list(current):
+                if key not in wanted:
+                    self._drop(holder, key)
+            for key, quantity in wanted.items():
+                self._drop(holder, key)
+                if quantity <= 0:
+                    continue
+                self._holds.setdefault(holder, {})[key] = Reservation(quantity, expires_at)
+                self._reserved[key] = self._reserved.get(key, 0) + quantity
+
+    def release(self, holder: str) -> None:
+        with self.lock:
+            for key in list(self._holds.get(holder, {})):
+                self._drop(holder, key)
+
+    def sweep(self, force: bool = False) -> int:
+        """Libera las reservas caducadas. Devuelve cuántas se liberaron."""
+        now = time.time()
+        with self.lock:
+            interval = getattr(settings, 'STOCK_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+            if not force and now - self._last_sweep < interval:
+                return 0
+            self._last_sweep = now
+            expired = [
+                (holder, key)
+                for holder, holds in self._holds.items()
+                for key, hold in holds.items()
+                if hold.expires_at <= now
+            ]
+            for holder, key in expired:
+                self._drop(holder, key)
+            return len(expired)
+
+    def _wanted(self, lines: Iterable[Tuple[int, Optional[str], int]]) -> Dict[StockKey, int]:
+        wanted: Dict[StockKey, int] = {}
+        for product_id, size, quantity in lines:
+            key = self.resolve(product_id, size) or (int(product_id), str(size) if size else None)
+            wanted[key] = wanted.get(key, 0) + int(quantity)
+        return wanted
+
+    @contextmanager
+    def checkout(self, holder: Optional[str], lines: Iterable[Tuple[int, Optional[str], int]]):
+        """Descuenta el stock de todas las líneas y ejecuta el bloque en la misma operación.
+
+        Con el ORM el descuento (``UPDATE ... WHERE stock >= qty`` por línea) y
+        el bloque comparten una transacción: si una línea no cabe o el bloque
+        falla, se deshace todo. Con MockDB se hace un compare-and-swap bajo el
+        cerrojo del ledger y, si el bloque falla, se repone el stock.
+        Lanza InsufficientStock sin haber descontado nada.
+        """
+        with self.lock:
+            self._refresh()
+            wanted = self._wanted(lines)
+        if hasattr(ProductSize.objects, '_items'):
+            with self.lock:
+                rows = _decrement_mock(wanted)
+                try:
+                    yield
+                except BaseException:
+                    _restore_mock(rows)
+                    raise
+                _persist_mock()
+                self._committed(holder, wanted)
+        else:
+            from django.db import transaction
+            with transaction.atomic():
+                _decrement_orm(wanted)
+                yield
+            with self.lock:
+                self._committed(holder, wanted)
+
+    def commit(self, holder: Optional[str], lines: Iterable[Tuple[int, Optional[str], int]]) -> None:
+        """Descuento sin nada más que hacer en la misma operación."""
+        with self.checkout(holder, lines):
+            pass
+
+    def _committed(self, holder: Optional[str], wanted: Dict[StockKey, int]) -> None:
+        for key, quantity in wanted.items():
+            self._on_hand[key] = self._on_hand.get(key, 0) - quantity
+            if key[1] is not None:
+                self._on_hand[(key[0], None)] = max(0, self._on_hand.get((key[0], None), 0) - quantity)
+        if holder:
+            self.release(holder)
+        # Los UPDATE con F() no disparan señales: invalidar páginas a mano.
+        # Solo cambia el stock; el índice del catálogo lo actualiza en su sitio.
+        bump_stock_version()
+        self._version = self._current_version()
+
+
+def _decrement_orm(wanted: Dict[StockKey, int]) -> None:
+    """Un UPDATE condicional por línea dentro de la transacción del llamador.
+
+    Las tallas son el stock que manda; ``Product.stock`` se mantiene como
+    total orientativo (sin bajar de 0) en los productos con tallas.
+    """
+    from django.db.models import F
+    from django.db.models.functions import Greatest
+    shortages = []
+    # Orden fijo de bloqueo para no provocar interbloqueos entre pedidos
+    for (pid, size), quantity in sorted(wanted.items(), key=lambda kv: (kv[0][0], kv[0][1] or '')):
+        if size is None:
+            updated = Product.objects.filter(id=pid, stock__gte=quantity).update(stock=F('stock') - quantity)
+        else:
+            updated = ProductSize.objects.filter(product_id=pid, size=size, stock__gte=quantity).update(stock=F('stock') - quantity)
+            if updated:
+                # Restar sin bajar de 0 en un solo UPDATE
+                Product.objects.filter(id=pid).update(stock=Greatest(F('stock') - quantity, 0))
+        if not updated:
+            current = (Product.objects.filter(id=pid) if size is None else
+                       ProductSize.objects.filter(product_id=pid, size=size)).values_list('stock', flat=True).first()
+            shortages.append(((pid, size), quantity, current or 0))
+    if shortages:
+        # La excepción sale del bloque atomic y deshace los UPDATE ya hechos
+        raise InsufficientStock(shortages)
+
+
+def _decrement_mock(wanted: Dict[StockKey, int]) -> Dict[StockKey, Tuple[object, int]]:
+    """Compare-and-swap de MockDB; se ejecuta bajo el cerrojo del ledger.
+
+    Devuelve el stock previo de cada fila tocada para poder reponerlo.
+    """
+    products = {p.id: p for p in Product.objects.all()}
+    sizes = {(s.product.id, str(s.size)): s for s in ProductSize.objects.all() if getattr(s, 'product', None) is not None}
+    shortages = []
+    for (pid, size), quantity in wanted.items():
+        row = products.get(pid) if size is None else sizes.get((pid, size))
+        stock = int(getattr(row, 'stock', 0) or 0) if row is not None else 0
+        if row is None or stock < quantity:
+            shortages.append(((pid, size), quantity, stock))
+    if shortages:
+        raise InsufficientStock(shortages)
+    previous: Dict[StockKey, Tuple[object, int]] = {}
+    for (pid, size), quantity in wanted.items():
+        product = products.get(pid)
+        if product is not None and (pid, None) not in previous:
+            previous[(pid, None)] = (product, int(getattr(product, 'stock', 0) or 0))
+        if size is not None:
+            row = sizes[(pid, size)]
+            previous[(pid, size)] = (row, int(row.stock))
+            row.stock = int(row.stock) - quantity
+        if product is not None:
+            product.stock = max(0, int(getattr(product, 'stock', 0) or 0) - quantity)
+    return previous
+
+
+def _restore_mock(previous: Dict[StockKey, Tuple[object, int]]) -> None:
+    for row, stock in previous.values():
+        row.stock = stock
+
+
+def _persist_mock() -> None:
+    try:
+        from tests.mockdb.patcher import save_product_sizes_to_fixture, save_products_to_fixture
+        save_products_to_fixture(stock_only=True)
+        save_product_sizes_to_fixture(stock_only=True)
+    except Exception as e:
+        print(f"[inventory] ⚠️ No se pudo persistir el stock: {e}")
+
+
+ledger = StockLedger()
@@ -0,0 +1,128 @@
+"""Paginación por clave (keyset/seek) sobre los órdenes del índice del catálogo.
+
+El cursor guarda la última clave vista ``(clave de orden, id)``; la página
+siguiente se localiza por posición (o por bisección si el producto ya no
+existe), de modo que una página profunda cuesta lo mismo que la primera.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .catalog import SortOrder
+
+DEFAULT_PAGE_SIZE = 12
+
+
+def page_size() -> int:
+    try:
+        return max(1, int(getattr(settings, 'SHOP_PAGE_SIZE', DEFAULT_PAGE_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def encode_cursor(order: str, key: Tuple[Any, int]) -> str:
+    raw = json.dumps([order, key[0], key[1]], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(order: str, cursor: Optional[str]) -> Optional[Tuple[Any, int]]:
+    """Devuelve la clave del cursor o None si falta, está corrupto o es de otro orden."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        name, key, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if name != order:
+            return None
+        return key, int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        return None
+
+
+@dataclass
+class KeysetPage:
+    object_list: List[Any] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.prev_cursor is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+
+def _seek(order: SortOrder, key: Tuple[Any, int], after: bool) -> int:
+    pos = order.positions.get(key[1])
+    if pos is not None and order.keys[pos] == key:
+        return pos + 1 if after else pos
+    try:
+        return bisect_right(order.keys, key) if after else bisect_left(order.keys, key)
+    except TypeError:
+        # Clave de un tipo que no corresponde al orden: empezar desde el principio
+        return 0
+
+
+def paginate(order: SortOrder, products: Dict[int, Any], candidates: Optional[Set[int]] = None,
+             after: Optional[str] = None, before: Optional[str] = None,
+             per_page: Optional[int] = None) -> KeysetPage:
+    """Página de ``per_page`` productos de ``order`` restringida a ``candidates``.
+
+    ``candidates`` es el conjunto de ids que cumplen los filtros (None = todos).
+    ``after``/``before`` son cursores opacos generados por páginas anteriores.
+    """
+    per_page = per_page or page_size()
+    ids = order.ids
+
+    def wanted(pk: int) -> bool:
+        return pk in products and (candidates is None or pk in candidates)
+
+    before_key = decode_cursor(order.name, before)
+    after_key = decode_cursor(order.name, after) if before_key is None else None
+
+    picked: List[int] = []
+    if before_key is not None:
+        i = _seek(order, before_key, after=False) - 1
+        while i >= 0 and len(picked) <= per_page:
+            if wanted(ids[i]):
+                picked.append(ids[i])
+            i -= 1
+        has_prev = len(picked) > per_page
+        picked = list(reversed(picked[:per_page]))
+        has_next = True
+    else:
+        i = _seek(order, after_key, after=True) if after_key is not None else 0
+        while i < len(ids) and len(picked) <= per_page:
+            if wanted(ids[i]):
+                picked.append(ids[i])
+            i += 1
+        has_next = len(picked) > per_page
+        picked = picked[:per_page]
+        has_prev = after_key is not None
+
+    page = KeysetPage(object_list=[products[pk] for pk in picked])
+    if picked:
+        if has_next:
+            page.next_cursor = encode_cursor(order.name, order.keys[order.positions[picked[-1]]])
+        if has_prev:
+            page.prev_cursor = encode_cursor(order.name, order.keys[order.positions[picked[0]]])
+    return page
@@ -0,0 +1,24 @@
+"""Invalidación de la caché del catálogo ante escrituras hechas con el ORM.
+
+En modo MockDB no hay señales: las funciones de persistencia de
+tests/mockdb/patcher.py incrementan la versión directamente.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .cache import bump_catalog_version, bump_stock_version
+from .models import Brand, Category, Product, ProductImage, ProductSize
+
+
+def _catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+def _stock_changed(sender, **kwargs):
+    bump_stock_version()
+
+
+for _model in (Product, Category, Brand, ProductImage, ProductSize):
+    post_save.connect(_catalog_changed, sender=_model, dispatch_uid=f'shop_catalog_changed_save_{_model.__name__}')
+    post_delete.connect(_catalog_changed, sender=_model, dispatch_uid=f'shop_catalog_changed_delete_{_model.__name__}')
+post_save.connect(_stock_changed, sender=ProductSize, dispatch_uid='shop_stock_changed_save')
+post_delete.connect(_stock_changed, sender=ProductSize, dispatch_uid='shop_stock_changed_delete')
@@ -0,0 +1,145 @@
+import tempfile
+import time
+from importlib import import_module
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from shop.cache import (
+    CART_BADGE_PLACEHOLDER,
+    bump_catalog_version,
+    bump_stock_version,
+    cache_catalog_page,
+    catalog_version,
+    conditional_catalog_page,
+    listing_etag,
+    page_cache_key,
+)
+
+
+class TestCatalogPageCache(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @cache_catalog_page
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'render {self.calls}')
+        self.view = view
+
+    def get(self, path='/shop/', **session):
+        request = self.factory.get(path)
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request.session.update(session)
+        return request
+
+    def test_key_ignores_parameter_order_and_empty_values(self):
+        a = page_cache_key(self.get('/shop/?color=rojo&brand=x&q='))
+        b = page_cache_key(self.get('/shop/?brand=x&color=rojo&utm_source=mail'))
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, page_cache_key(self.get('/shop/?brand=y&color=rojo')))
+
+    def test_hit_skips_view_until_version_bump(self):
+        self.assertEqual(self.view(self.get()).content, b'render 1')
+        self.assertEqual(self.view(self.get()).content, b'render 1')
+        self.assertEqual(self.calls, 1)
+
+        old = catalog_version()
+        self.assertGreater(bump_catalog_version(), old)
+        self.assertEqual(self.view(self.get()).content, b'render 2')
+
+    def test_bumped_version_does_not_expire_on_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES={'default': backend}):
+                catalog_version()
+                version = bump_catalog_version()
+                later = time.time() + 3600
+                with patch('time.time', return_value=later):
+                    self.assertEqual(catalog_version(), version)
+
+    def test_personalised_sessions_bypass_cache(self):
+        self.view(self.get())
+        self.view(self.get(mock_user_role='admin'))
+        self.assertEqual(self.calls, 2)
+
+    def test_cart_badge_is_filled_per_visitor(self):
+        @cache_catalog_page
+        def badge_view(request):
+            self.calls += 1
+            badge = CART_BADGE_PLACEHOLDER if getattr(request, 'punch_holes', False) else 'x'
+            return HttpResponse(f'<span class="count">{badge}</span>')
+
+        empty = badge_view(self.get())
+        full = badge_view(self.get(**{settings.CART_SESSION_ID: {'1_40': {'quantity': 2}, '3': {'quantity': 1}}}))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(empty.content, b'<span class="count">0</span>')
+        self.assertEqual(full.content, b'<span class="count">3</span>')
+
+    def test_cached_csrf_token_is_replaced(self):
+        template = engines['django'].from_string('<input type="hidden" name="csrfmiddlewaretoken" value="{{ token }}">')
+
+        @cache_catalog_page
+        def form_view(request):
+            return HttpResponse(template.render({'token': 'first-visitor'}))
+
+        form_view(self.get('/shop/1/x/'))
+        hit = form_view(self.get('/shop/1/x/'))
+        self.assertNotIn(b'first-visitor', hit.content)
+        self.assertIn(b'csrfmiddlewaretoken', hit.content)
+
+
+class TestConditionalGet(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @conditional_catalog_page(etag_func=listing_etag)
+        def view(request):
+            self.calls += 1
+            return HttpResponse('listing')
+        self.view = view
+
+    def get(self, path='/shop/', cart=None, **headers):
+        request = self.factory.get(path, **headers)
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        if cart:
+            request.session[settings.CART_SESSION_ID] = cart
+        return request
+
+    def test_matching_etag_returns_304_without_rendering(self):
+        first = self.view(self.get())
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        revalidated = self.view(self.get(HTTP_IF_NONE_MATCH=first['ETag']))
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+    def test_version_bumps_change_etag(self):
+        etag = self.view(self.get())['ETag']
+        bump_stock_version()
+        self.assertEqual(self.view(self.get(HTTP_IF_NONE_MATCH=etag)).status_code, 200)
+        etag = self.view(self.get())['ETag']
+        bump_catalog_version()
+        self.assertEqual(self.view(self.get(HTTP_IF_NONE_MATCH=etag)).status_code, 200)
+
+    def test_cart_contents_change_etag(self):
+        etag = self.view(self.get())['ETag']
+        response = self.view(self.get(cart={'1': {'quantity': 1}}, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+
+    def test_personalised_sessions_get_no_validators(self):
+        request = self.get()
+        request.session['mock_user_role'] = 'admin'
+        response = self.view(request)
+        self.assertFalse(response.has_header('ETag'))
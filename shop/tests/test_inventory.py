@@ -0,0 +1,120 @@
+import copy
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from shop.cache import catalog_version
+from shop.catalog import get_catalog_index, reset_catalog_index
+from shop.inventory import InsufficientStock, StockLedger, _decrement_orm
+from shop.models import Brand, Category, Product, ProductSize
+from tests.mockdb.sqlite import sqlite_database
+
+
+@patch('tests.mockdb.patcher.save_product_sizes_to_fixture')
+@patch('tests.mockdb.patcher.save_products_to_fixture')
+class TestStockReservations(SimpleTestCase):
+
+    def setUp(self):
+        self.ledger = StockLedger()
+        self.size = next(s for s in ProductSize.objects.all() if s.stock > 1 and s.product.available)
+        self.original_stock = self.size.stock
+        self.product_stock = self.size.product.stock
+        self.pid, self.label = self.size.product.id, self.size.size
+
+    def tearDown(self):
+        self.size.stock = self.original_stock
+        self.size.product.stock = self.product_stock
+
+    def test_reservations_hide_stock_from_other_carts(self, *_):
+        self.ledger.reserve_cart('a', [(self.pid, self.label, self.original_stock - 1)])
+        self.assertEqual(self.ledger.available(self.pid, self.label, 'b'), 1)
+        self.assertEqual(self.ledger.available(self.pid, self.label, 'a'), self.original_stock)
+        with self.assertRaises(InsufficientStock):
+            self.ledger.reserve_cart('b', [(self.pid, self.label, 2)])
+        # Shrinking never fails, and frees stock for the others
+        self.ledger.reserve_cart('a', [(self.pid, self.label, 1)], strict=False)
+        self.assertEqual(self.ledger.available(self.pid, self.label, 'b'), self.original_stock - 1)
+
+    @override_settings(STOCK_RESERVATION_TTL=-1)
+    def test_sweeper_releases_expired_reservations(self, *_):
+        self.ledger.reserve_cart('a', [(self.pid, self.label, self.original_stock)])
+        self.assertEqual(self.ledger.sweep(force=True), 1)
+        self.assertEqual(self.ledger.available(self.pid, self.label, 'b'), self.original_stock)
+
+    def test_commit_decrements_and_releases(self, *_):
+        self.ledger.reserve_cart('a', [(self.pid, self.label, 2)])
+        self.ledger.commit('a', [(self.pid, self.label, 2)])
+        self.assertEqual(self.size.stock, self.original_stock - 2)
+        self.assertEqual(self.ledger.available(self.pid, self.label, 'b'), self.original_stock - 2)
+        with self.assertRaises(InsufficientStock):
+            self.ledger.commit('b', [(self.pid, self.label, self.original_stock)])
+        self.assertEqual(self.size.stock, self.original_stock - 2)
+
+    def test_commit_updates_index_stock_without_rebuilding_catalog(self, save_products, save_sizes):
+        reset_catalog_index()
+        self.addCleanup(reset_catalog_index)
+        index = get_catalog_index()
+        version = catalog_version()
+        # Con el ORM el índice guarda copias de los productos, no las filas vivas
+        index.products[self.pid] = copy.copy(self.size.product)
+        self.ledger.commit('a', [(self.pid, self.label, 2)])
+        save_products.assert_called_once_with(stock_only=True)
+        save_sizes.assert_called_once_with(stock_only=True)
+        self.assertEqual(catalog_version(), version)
+        with patch('shop.catalog._load_products') as load:
+            self.assertIs(get_catalog_index(), index)
+        load.assert_not_called()
+        self.assertEqual(index.products[self.pid].stock, self.size.product.stock)
+        self.assertEqual(self.size.product.stock, max(0, self.product_stock - 2))
+
+    def test_failed_block_or_short_line_rolls_back_everything(self, *_):
+        other = next(s for s in ProductSize.objects.all() if s is not self.size)
+        other_stock = other.stock
+        with self.assertRaises(InsufficientStock):
+            self.ledger.commit('a', [(self.pid, self.label, 1), (other.product.id, other.size, other_stock + 1)])
+        with self.assertRaises(RuntimeError):
+            with self.ledger.checkout('a', [(self.pid, self.label, 1)]):
+                raise RuntimeError('order creation failed')
+        self.assertEqual((self.size.stock, other.stock), (self.original_stock, other_stock))
+
+    def test_concurrent_checkouts_never_oversell(self, *_):
+        buyers = self.original_stock * 4
+        barrier = threading.Barrier(buyers)
+        sold, rejected = [], []
+
+        def buy(n):
+            barrier.wait()
+            try:
+                with self.ledger.checkout(f'buyer-{n}', [(self.pid, self.label, 1)]):
+                    sold.append(n)
+            except InsufficientStock:
+                rejected.append(n)
+
+        threads = [threading.Thread(target=buy, args=(n,)) for n in range(buyers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(sold), self.original_stock)
+        self.assertEqual(len(rejected), buyers - self.original_stock)
+        self.assertEqual(self.size.stock, 0)
+
+
+class TestStockDecrementOrm(SimpleTestCase):
+
+    def test_sized_line_keeps_product_total_in_step(self):
+        with sqlite_database(Category, Brand, Product, ProductSize):
+            category = Category.objects.create(name='Zapatillas', slug='zapatillas')
+            product = Product.objects.create(category=category, name='Runner', slug='runner', price=50, stock=3)
+            ProductSize.objects.create(product=product, size='42', stock=3)
+            other = Product.objects.create(category=category, name='Trail', slug='trail', price=60, stock=1)
+            ProductSize.objects.create(product=other, size='40', stock=5)
+            _decrement_orm({(product.id, '42'): 2, (other.id, '40'): 2})
+            self.assertEqual(Product.objects.get(id=product.id).stock, 1)
+            self.assertEqual(ProductSize.objects.get(product=product).stock, 1)
+            # El total orientativo no baja de 0
+            self.assertEqual(Product.objects.get(id=other.id).stock, 0)
+            with self.assertRaises(InsufficientStock):
+                _decrement_orm({(product.id, '42'): 2})
+            self.assertEqual(ProductSize.objects.get(product=product).stock, 1)
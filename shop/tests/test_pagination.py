@@ -0,0 +1,101 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from shop.catalog import CatalogIndex
+from shop.pagination import decode_cursor, encode_cursor, paginate
+
+
+def make_products(n):
+    return [SimpleNamespace(id=i, name=f"product {i:02d}", brand=None, color='', material='') for i in range(1, n + 1)]
+
+
+class TestKeysetPagination(SimpleTestCase):
+
+    def setUp(self):
+        self.index = CatalogIndex(make_products(25))
+        self.order = self.index.order('name')
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor('name', ('zapato', 7))
+        self.assertEqual(decode_cursor('name', cursor), ('zapato', 7))
+        self.assertIsNone(decode_cursor('price', cursor))
+        self.assertIsNone(decode_cursor('name', 'not-a-cursor'))
+
+    def test_walk_forward_and_back(self):
+        first = paginate(self.order, self.index.products, per_page=10)
+        self.assertEqual([p.id for p in first], list(range(1, 11)))
+        self.assertFalse(first.has_previous)
+
+        second = paginate(self.order, self.index.products, after=first.next_cursor, per_page=10)
+        self.assertEqual([p.id for p in second], list(range(11, 21)))
+
+        last = paginate(self.order, self.index.products, after=second.next_cursor, per_page=10)
+        self.assertEqual([p.id for p in last], list(range(21, 26)))
+        self.assertFalse(last.has_next)
+
+        back = paginate(self.order, self.index.products, before=last.prev_cursor, per_page=10)
+        self.assertEqual([p.id for p in back], list(range(11, 21)))
+        self.assertTrue(back.has_next and back.has_previous)
+
+    def test_candidates_restrict_page(self):
+        evens = {i for i in range(1, 26) if i % 2 == 0}
+        first = paginate(self.order, self.index.products, evens, per_page=5)
+        self.assertEqual([p.id for p in first], [2, 4, 6, 8, 10])
+        second = paginate(self.order, self.index.products, evens, after=first.next_cursor, per_page=5)
+        self.assertEqual([p.id for p in second], [12, 14, 16, 18, 20])
+
+    def test_cursor_survives_removed_product(self):
+        first = paginate(self.order, self.index.products, per_page=10)
+        smaller = CatalogIndex([p for p in make_products(25) if p.id != 10])
+        second = paginate(smaller.order('name'), smaller.products, after=first.next_cursor, per_page=10)
+        self.assertEqual(second.object_list[0].id, 11)
+
+
+class TestSortOrders(SimpleTestCase):
+
+    def setUp(self):
+        self.products = [
+            SimpleNamespace(id=1, name='a', price=Decimal('50'), offer_price=Decimal('0'), brand=None, color='', material=''),
+            SimpleNamespace(id=2, name='b', price=Decimal('80'), offer_price=Decimal('40'), brand=None, color='', material=''),
+            SimpleNamespace(id=3, name='c', price=Decimal('30'), offer_price=Decimal('0'), brand=None, color='', material=''),
+        ]
+        self.index = CatalogIndex(self.products)
+
+    def ids(self, sort):
+        return [p.id for p in paginate(self.index.order(sort), self.index.products)]
+
+    def test_price_uses_offer_price(self):
+        self.assertEqual(self.ids('price'), [3, 2, 1])
+        self.assertEqual(self.ids('-price'), [1, 2, 3])
+
+    def test_discount_and_newest(self):
+        self.assertEqual(self.ids('discount')[0], 2)
+        self.assertEqual(self.ids('newest'), [3, 2, 1])
+
+    def test_unknown_sort_falls_back_to_name(self):
+        self.assertEqual(self.ids('bogus'), [1, 2, 3])
+
+
+class TestCatalogFilters(SimpleTestCase):
+
+    def setUp(self):
+        brand = SimpleNamespace(name='acme')
+        self.index = CatalogIndex([
+            SimpleNamespace(id=1, name='a', price=Decimal('50'), offer_price=Decimal('0'), brand=brand, color='rojo', material=''),
+            SimpleNamespace(id=2, name='b', price=Decimal('80'), offer_price=Decimal('40'), brand=None, color='rojo', material=''),
+            SimpleNamespace(id=3, name='c', price=Decimal('30'), offer_price=Decimal('0'), brand=brand, color='azul', material=''),
+        ])
+
+    def test_price_range_is_inclusive(self):
+        self.assertEqual(self.index.price_range(Decimal('30'), Decimal('40')), {2, 3})
+        self.assertEqual(self.index.price_range(min_price=Decimal('41')), {1})
+        self.assertEqual(self.index.price_range(max_price=Decimal('29.99')), set())
+
+    def test_filters_intersect(self):
+        self.assertIsNone(self.index.filter_ids())
+        self.assertEqual(self.index.filter_ids(brands=['acme'], colors=['rojo']), {1})
+        self.assertEqual(self.index.filter_ids(colors=['rojo'], max_price=Decimal('45')), {2})
+        # Unknown brands are ignored, like the old Brand lookup
+        self.assertEqual(self.index.filter_ids(brands=['nope'], colors=['azul']), {3})
@@ -1,70 +1,167 @@
-from django.shortcuts import render, get_object_or_404
+from decimal import Decimal, InvalidOperation
+from django.http import Http404
+from django.shortcuts import render
 from cart.forms import CartAddProductForm
-from .models import Category, Product, ProductSize, Brand
+from .models import Category, Product, ProductSize
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib import messages
+from .cache import cache_catalog_page, catalog_version, conditional_catalog_page, listing_etag, stock_version
+from .catalog import DEFAULT_SORT, SORT_CHOICES, get_catalog_index
+from .pagination import paginate
 
 
+def _product_ids(products):
+    """Ids de un queryset (ORM o MockDB) o de una lista de productos."""
+    values_list = getattr(products, 'values_list', None)
+    if values_list is not None:
+        return set(values_list('id', flat=True))
+    return {p.id for p in products}
+
+
+def _page_url(request, **cursor):
+    """URL de otra página conservando los filtros actuales de la query string."""
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params.update(cursor)
+    return '?' + params.urlencode()
+
+
+def _selected_sort(request):
+    sort = request.GET.get('sort') or DEFAULT_SORT
+    return sort if sort in dict(SORT_CHOICES) else DEFAULT_SORT
+
+
+def _sort_options(request, selected):
+    """Enlaces de ordenación: conservan los filtros y vuelven a la primera página."""
+    options = []
+    for value, label in SORT_CHOICES:
+        params = request.GET.copy()
+        for key in ('after', 'before', 'sort'):
+            params.pop(key, None)
+        if value != DEFAULT_SORT:
+            params['sort'] = value
+        options.append({'value': value, 'label': label, 'url': '?' + params.urlencode(), 'selected': value == selected})
+    return options
+
+
+def _paginated_context(request, index, candidates):
+    sort = _selected_sort(request)
+    page = paginate(
+        index.order(sort), index.products, candidates,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    return {
+        'sort': sort,
+        'sort_options': _sort_options(request, sort),
+        'products': page.object_list,
+        'page': page,
+        'result_count': len(index) if candidates is None else len(candidates),
+        'next_page_url': _page_url(request, after=page.next_cursor) if page.has_next else None,
+        'prev_page_url': _page_url(request, before=page.prev_cursor) if page.has_previous else None,
+    }
+
+
+def _price_param(request, name):
+    value = (request.GET.get(name) or '').strip().replace(',', '.')
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+@conditional_catalog_page(etag_func=listing_etag)
+@cache_catalog_page
 def product_list(request, category_slug=None):
     category = None
     categories = Category.objects.all()
-    products = Product.objects.filter(available=True)
+    index = get_catalog_index()
     
     # Get multiple values for each filter using getlist
     selected_brands = request.GET.getlist('brand')
     selected_colors = request.GET.getlist('color')
     selected_materials = request.GET.getlist('material')
+    selected_sizes = request.GET.getlist('size')
     selected_category = request.GET.get('category')
+    min_price = _price_param(request, 'min_price')
+    max_price = _price_param(request, 'max_price')
     
     # Category filter - can come from URL slug or query parameter
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
+        try:
+            category = Category.objects.get(slug=category_slug)
+        except Category.DoesNotExist:
+            raise Http404('Categoría no encontrada')
     elif selected_category:
         try:
             category = Category.objects.get(slug=selected_category)
-            products = products.filter(category=category)
         except Category.DoesNotExist:
             pass
     
-    # Brand filter (multiple selection) - Fixed to work with Brand model
-    if selected_brands:
-        # Filter by brand name or ID
-        brand_objects = Brand.objects.filter(name__in=selected_brands)
-        if brand_objects:
-            products = products.filter(brand__in=brand_objects)
-    
-    # Color filter (multiple selection)
-    if selected_colors:
-        products = products.filter(color__in=selected_colors)
-    
-    # Material filter (multiple selection)
-    if selected_materials:
-        products = products.filter(material__in=selected_materials)
-    
-    # Get all unique values for filters from ALL available products
-    all_products = Product.objects.filter(available=True)
-    brands = list(set([p.brand.name for p in all_products if p.brand]))
-    colors = list(set([p.color for p in all_products if p.color]))
-    materials = list(set([p.material for p in all_products if p.material]))
+    # All filters are resolved against the catalog index posting lists and
+    # intersected in one pass (smallest set first)
+    candidates = index.filter_ids(
+        category_id=category.id if category else None,
+        brands=selected_brands,
+        colors=selected_colors,
+        materials=selected_materials,
+        sizes=selected_sizes,
+        min_price=min_price,
+        max_price=max_price,
+    )
     
     context = {
         'category': category,
         'categories': categories,
-        'products': products,
-        'brands': sorted(brands),
-        'colors': sorted(colors),
-        'materials': sorted(materials),
+        # Unique filter values are precomputed by the index
+        'brands': index.brands,
+        'colors': index.colors,
+        'materials': index.materials,
+        'sizes': index.sizes,
         'selected_brands': selected_brands,
         'selected_colors': selected_colors,
         'selected_materials': selected_materials,
+        'selected_sizes': selected_sizes,
+        'min_price': min_price,
+        'max_price': max_price,
     }
+    context.update(_paginated_context(request, index, candidates))
     return render(request, 'shop/product/list.html', context)
 
 
+def _indexed_product(id, slug):
+    product = get_catalog_index().products.get(id)
+    if product is None or getattr(product, 'slug', None) != slug:
+        return None
+    return product
+
+
+def _product_etag(request, id, slug):
+    """Versión del producto (updated, o la del catálogo en MockDB) más la del stock."""
+    product = _indexed_product(id, slug)
+    if product is None:
+        return None
+    updated = getattr(product, 'updated', None)
+    stamp = updated.isoformat() if updated is not None else catalog_version()
+    return f"p{product.id}-{stamp}-{stock_version()}"
+
+
+def _product_last_modified(request, id, slug):
+    product = _indexed_product(id, slug)
+    return getattr(product, 'updated', None)
+
+
+@conditional_catalog_page(etag_func=_product_etag, last_modified_func=_product_last_modified)
+@cache_catalog_page
 def product_detail(request, id, slug):
-    product = get_object_or_404(Product.objects, id=id, slug=slug, available=True)
+    # El índice solo contiene productos disponibles; sirve también para el 404
+    product = _indexed_product(id, slug)
+    if product is None:
+        raise Http404('Producto no encontrado')
     cart_product_form = CartAddProductForm()
     sizes = list(ProductSize.objects.filter(product=product))
     
@@ -104,9 +201,11 @@ def product_detail(request, id, slug):
     return render(request, 'shop/product/detail.html', context)
 
 
+@conditional_catalog_page(etag_func=listing_etag)
+@cache_catalog_page
 def home(request):
-    all_products = Product.objects.filter(available=True)
-    featured_products = list(all_products)[:8]
+    index = get_catalog_index()
+    featured_products = paginate(index.order(DEFAULT_SORT), index.products, per_page=8).object_list
     return render(request, 'shop/home.html', {'products': featured_products})
 
 
@@ -142,7 +241,9 @@ def contact(request):
 
 def product_search(request):
     query = request.GET.get('q', '')
-    products = Product.objects.filter(available=True)
+    index = get_catalog_index()
+    products = list(index.products.values())
+    candidates = None
     
     if query:
         query_lower = query.lower()
@@ -171,13 +272,13 @@ def product_search(request):
                 matching_products.append(product)
                 continue
         
-        products = matching_products
+        candidates = _product_ids(matching_products)
     
     context = {
-        'products': products,
         'search_query': query,
         'categories': list(Category.objects.all()),
     }
+    context.update(_paginated_context(request, index, candidates))
     return render(request, 'shop/product/list.html', context)
     query = request.GET.get('q', '')
     products = Product.objects.filter(available=True)
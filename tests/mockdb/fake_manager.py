@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from datetime import datetime
 from decimal import Decimal
 from types import SimpleNamespace
 from typing import Any, Dict, Iterable, Iterator, List, Optional, Type
@@ -82,12 +83,15 @@ class FakeOrderItem:
     product: FakeProduct
     price: Decimal
     quantity: int = 1
+    size: str = ""
+    unit_price: Decimal = Decimal("0")
+    line_total: Decimal = Decimal("0")
 
     def __str__(self) -> str:
         return str(self.id)
 
     def get_cost(self) -> Decimal:
-        return self.price * self.quantity
+        return self.line_total or self.price * self.quantity
 
 
 @dataclass
@@ -117,9 +121,11 @@ class FakeOrder:
         return f"Order {self.order_number or self.id}"
 
     def get_total_cost(self) -> Decimal:
-        # Puede ser calculado desde OrderItem externamente si no hay total
         return self.total
 
+    def get_shipping_cost(self) -> Decimal:
+        return self.shipping_cost
+
     def save(self) -> None:
         """
         No-op save to mimic Django model instance behaviour in tests/dev with FakeManager.
@@ -192,6 +198,18 @@ class FakeCartItem:
     quantity: int
 
 
+@dataclass
+class FakeEmailOutbox:
+    id: int
+    order: Any
+    kind: str
+    status: str
+    attempts: int
+    last_error: str
+    next_attempt_at: datetime
+    sent_at: Optional[datetime] = None
+
+
 @dataclass
 class FakeUserAccount:
     id: int
@@ -332,6 +350,7 @@ def _construct_fake_for_model(model_class: Type[Any], kwargs: Dict[str, Any]) ->
     from shop.models import Category as DjangoCategory, Product as DjangoProduct, Brand as DjangoBrand, ProductImage as DjangoProductImage, ProductSize as DjangoProductSize
     from order.models import Order as DjangoOrder, OrderItem as DjangoOrderItem, Customer as DjangoCustomer
     from cart.models import Cart as DjangoCart, CartItem as DjangoCartItem
+    from order.models import EmailOutbox as DjangoEmailOutbox
     try:
         from accounts.models import UserAccount as DjangoUserAccount
     except Exception:  # pragma: no cover - accounts may not be installed in some contexts
@@ -386,7 +405,10 @@ def _construct_fake_for_model(model_class: Type[Any], kwargs: Dict[str, Any]) ->
             order=kwargs.get('order'),
             product=kwargs['product'],
             price=Decimal(str(kwargs.get('price', '0'))),
-            quantity=int(kwargs.get('quantity', 1))
+            quantity=int(kwargs.get('quantity', 1)),
+            size=str(kwargs.get('size', '') or ''),
+            unit_price=Decimal(str(kwargs.get('unit_price', '0'))),
+            line_total=Decimal(str(kwargs.get('line_total', '0'))),
         )
 
     if model_class.__name__ == 'Order' and model_class is DjangoOrder:
@@ -426,6 +448,14 @@ def _construct_fake_for_model(model_class: Type[Any], kwargs: Dict[str, Any]) ->
     if model_class.__name__ == 'Cart' and model_class is DjangoCart:
         return FakeCart(id=kwargs['id'], customer=kwargs['customer'])
 
+    if model_class.__name__ == 'EmailOutbox' and model_class is DjangoEmailOutbox:
+        return FakeEmailOutbox(
+            id=kwargs['id'], order=kwargs['order'], kind=str(kwargs.get('kind', 'confirmation')),
+            status=str(kwargs.get('status', 'pending')), attempts=int(kwargs.get('attempts', 0)),
+            last_error=str(kwargs.get('last_error', '')), next_attempt_at=kwargs['next_attempt_at'],
+            sent_at=kwargs.get('sent_at'),
+        )
+
     if model_class.__name__ == 'CartItem' and model_class is DjangoCartItem:
         return FakeCartItem(id=kwargs['id'], cart=kwargs['cart'], product=kwargs['product'], size=str(kwargs['size']), quantity=int(kwargs['quantity']))
 
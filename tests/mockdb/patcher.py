@@ -33,7 +33,7 @@ class MockDB:
 
     def apply(self) -> None:
         from shop.models import Category, Product, Brand, ProductImage, ProductSize
-        from order.models import Order, OrderItem, Customer
+        from order.models import Order, OrderItem, Customer, EmailOutbox
         from cart.models import Cart, CartItem
         try:
             from accounts.models import UserAccount
@@ -197,6 +197,16 @@ class MockDB:
             self._patch_manager(Cart, FakeManager(Cart, carts))
             self._patch_manager(CartItem, FakeManager(CartItem, cart_items))
             self._patch_manager(OrderItem, FakeManager(OrderItem, order_items))
+
+            outbox: List[Any] = []
+            for d in self._data.get('email_outbox', []):
+                try:
+                    outbox.append(_to_fake_email_outbox(d, orders_by_id))
+                except KeyError as e:
+                    print(f"[mockdb] ⚠️ EmailOutbox inválido (order no encontrado): {e} -> {d}")
+                except Exception as e:
+                    print(f"[mockdb] ⚠️ EmailOutbox inválido: {e} -> {d}")
+            self._patch_manager(EmailOutbox, FakeManager(EmailOutbox, outbox))
             if UserAccount:
                 self._patch_manager(UserAccount, FakeManager(UserAccount, users))
         except Exception as e:
@@ -241,9 +251,26 @@ class MockDB:
         return getattr(model_class, 'objects')  # type: ignore[return-value]
 
 
-def save_products_to_fixture() -> None:
+def _bump_catalog_version(stock: bool = False, catalog: bool = True) -> None:
+    """Invalida la caché de páginas del catálogo tras persistir cambios.
+
+    Con ``catalog=False`` solo cambia la versión de stock (p. ej. al descontar
+    stock en un pedido), sin reconstruir el índice del catálogo.
+    """
+    try:
+        from shop.cache import bump_catalog_version, bump_stock_version
+        if catalog:
+            bump_catalog_version()
+        if stock:
+            bump_stock_version()
+    except Exception as e:
+        print(f"[mockdb] ⚠️ No se pudo invalidar la caché del catálogo: {e}")
+
+
+def save_products_to_fixture(stock_only: bool = False) -> None:
     """Vuelca el estado actual de Product.objects a tests/mockdb/data/products.json.
     Útil para persistir cambios del admin-lite entre reinicios en desarrollo.
+    ``stock_only`` indica que solo cambió el stock: no invalida el catálogo.
     """
     from shop.models import Product
 
@@ -281,6 +308,35 @@ def save_products_to_fixture() -> None:
     with open(path, "w", encoding="utf-8") as f:
         json.dump(items, f, ensure_ascii=False, indent=2)
     print(f"[mockdb] 💾 Guardados {len(items)} productos en {path}")
+    _bump_catalog_version(stock=True, catalog=not stock_only)
+
+
+def save_product_sizes_to_fixture(stock_only: bool = False) -> None:
+    """Vuelca ProductSize.objects (tallas y stock) a tests/mockdb/data/product_sizes.json.
+    ``stock_only`` indica que solo cambió el stock: no invalida el catálogo.
+    """
+    from shop.models import ProductSize
+
+    base = Path(settings.BASE_DIR)
+    if base.name == "config":
+        base = base.parent
+    data_dir = base / "tests" / "mockdb" / "data"
+    path = data_dir / "product_sizes.json"
+
+    items = [
+        {
+            "id": int(getattr(s, 'id', 0) or 0),
+            "product": int(getattr(getattr(s, 'product', None), 'id', 0) or 0),
+            "size": str(getattr(s, 'size', '')),
+            "stock": int(getattr(s, 'stock', 0) or 0),
+        }
+        for s in ProductSize.objects.all()
+    ]
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    print(f"[mockdb] 💾 Guardadas {len(items)} tallas en {path}")
+    _bump_catalog_version(stock=True, catalog=not stock_only)
 
 
 def save_orders_to_fixture() -> None:
@@ -344,6 +400,9 @@ def save_order_items_to_fixture() -> None:
             "product": int(getattr(getattr(oi, 'product', None), 'id', 0) or 0),
             "price": str(getattr(oi, 'price', '0')),
             "quantity": int(getattr(oi, 'quantity', 0) or 0),
+            "size": str(getattr(oi, 'size', '') or ''),
+            "unit_price": str(getattr(oi, 'unit_price', '0')),
+            "line_total": str(getattr(oi, 'line_total', '0')),
         }
 
     items = [to_dict(oi) for oi in OrderItem.objects.all()]
@@ -353,6 +412,38 @@ def save_order_items_to_fixture() -> None:
     print(f"[mockdb] 💾 Guardadas {len(items)} líneas de pedido en {path}")
 
 
+def save_email_outbox_to_fixture() -> None:
+    """Vuelca EmailOutbox.objects a tests/mockdb/data/email_outbox.json."""
+    from order.models import EmailOutbox
+
+    base = Path(settings.BASE_DIR)
+    if base.name == "config":
+        base = base.parent
+    data_dir = base / "tests" / "mockdb" / "data"
+    path = data_dir / "email_outbox.json"
+
+    def when(value: Any) -> Optional[str]:
+        return value.isoformat() if value is not None else None
+
+    items = [
+        {
+            "id": int(getattr(e, 'id', 0) or 0),
+            "order": int(getattr(getattr(e, 'order', None), 'id', 0) or 0),
+            "kind": str(getattr(e, 'kind', 'confirmation')),
+            "status": str(getattr(e, 'status', 'pending')),
+            "attempts": int(getattr(e, 'attempts', 0) or 0),
+            "last_error": str(getattr(e, 'last_error', '')),
+            "next_attempt_at": when(getattr(e, 'next_attempt_at', None)),
+            "sent_at": when(getattr(e, 'sent_at', None)),
+        }
+        for e in EmailOutbox.objects.all()
+    ]
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    print(f"[mockdb] 💾 Guardados {len(items)} correos pendientes en {path}")
+
+
 def save_customers_to_fixture() -> None:
     """Vuelca Customer.objects a tests/mockdb/data/customers.json."""
     from order.models import Customer
@@ -382,6 +473,40 @@ def save_customers_to_fixture() -> None:
     print(f"[mockdb] 💾 Guardados {len(items)} clientes en {path}")
 
 
+def save_carts_to_fixture() -> None:
+    """Vuelca Cart.objects y CartItem.objects a carts.json y cart_items.json."""
+    from cart.models import Cart, CartItem
+
+    base = Path(settings.BASE_DIR)
+    if base.name == "config":
+        base = base.parent
+    data_dir = base / "tests" / "mockdb" / "data"
+
+    carts = [
+        {
+            "id": int(getattr(c, 'id', 0) or 0),
+            "customer": int(getattr(getattr(c, 'customer', None), 'id', 0) or 0),
+        }
+        for c in Cart.objects.all()
+    ]
+    items = [
+        {
+            "id": int(getattr(i, 'id', 0) or 0),
+            "cart": int(getattr(getattr(i, 'cart', None), 'id', 0) or 0),
+            "product": int(getattr(getattr(i, 'product', None), 'id', 0) or 0),
+            "size": str(getattr(i, 'size', '')),
+            "quantity": int(getattr(i, 'quantity', 0) or 0),
+        }
+        for i in CartItem.objects.all()
+    ]
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(data_dir / "carts.json", "w", encoding="utf-8") as f:
+        json.dump(carts, f, ensure_ascii=False, indent=2)
+    with open(data_dir / "cart_items.json", "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    print(f"[mockdb] 💾 Guardados {len(carts)} carritos y {len(items)} líneas en {data_dir}")
+
+
 def save_user_accounts_to_fixture() -> None:
     """Vuelca UserAccount.objects a tests/mockdb/data/users.json.
     Útil para persistir altas/bajas/cambios de usuarios (admins o customers) desde el admin-lite.
@@ -449,6 +574,7 @@ def load_default_data() -> Dict[str, List[Dict[str, Any]]]:
         "cart_items": load("cart_items"),
         "order_items": load("order_items"),
         "orders": load("orders"),
+        "email_outbox": load("email_outbox"),
             "users": load("users"),  # soporte opcional de usuarios completos
     }
     print(
@@ -559,7 +685,30 @@ def _to_fake_order_item(d: Dict[str, Any], orders_by_id: Dict[int, Any], product
         order=order,
         product=product,
         price=d.get('price', '0'),
-        quantity=int(d.get('quantity', 1))
+        quantity=int(d.get('quantity', 1)),
+        size=d.get('size', ''),
+        unit_price=d.get('unit_price', '0'),
+        line_total=d.get('line_total', '0'),
+    )
+
+
+def _to_fake_email_outbox(d: Dict[str, Any], orders_by_id: Dict[int, Any]):
+    from datetime import datetime
+    from order.models import EmailOutbox
+    mgr = FakeManager(EmailOutbox, [])
+
+    def when(value: Any) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if value else None
+
+    return mgr.create(
+        id=int(d['id']),
+        order=orders_by_id[int(d['order'])],
+        kind=d.get('kind', 'confirmation'),
+        status=d.get('status', 'pending'),
+        attempts=int(d.get('attempts', 0)),
+        last_error=d.get('last_error', ''),
+        next_attempt_at=when(d.get('next_attempt_at')),
+        sent_at=when(d.get('sent_at')),
     )
 
 
@@ -646,6 +795,7 @@ def save_categories_to_fixture() -> None:
     with open(path, "w", encoding="utf-8") as f:
         json.dump(items, f, ensure_ascii=False, indent=2)
     print(f"[mockdb] 💾 Guardadas {len(items)} categorías en {path}")
+    _bump_catalog_version()
 
 def save_brands_to_fixture() -> None:
     """Vuelca el estado actual de Brand.objects a tests/mockdb/data/brands.json."""
@@ -668,4 +818,5 @@ def save_brands_to_fixture() -> None:
     data_dir.mkdir(parents=True, exist_ok=True)
     with open(path, "w", encoding="utf-8") as f:
         json.dump(items, f, ensure_ascii=False, indent=2)
-    print(f"[mockdb] 💾 Guardadas {len(items)} marcas en {path}")
\ No newline at end of file
+    print(f"[mockdb] 💾 Guardadas {len(items)} marcas en {path}")
+    _bump_catalog_version()
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+SQLite en memoria para probar las rutas del ORM desde tests sin base de datos.
+
+Mientras dura el bloque, la conexión 'default' apunta a una base SQLite en
+memoria con las tablas de los modelos indicados, y esos modelos recuperan su
+manager real aunque MockDB los tenga parcheados:
+
+    with sqlite_database(Category, Product, ProductSize):
+        Product.objects.create(...)
+"""
+from contextlib import ExitStack, contextmanager
+from typing import Any, Iterator
+from unittest.mock import patch
+
+from django.db import connections
+
+ALIAS = 'orm_tests'
+
+
+@contextmanager
+def sqlite_database(*models: Any) -> Iterator[Any]:
+    connections.databases[ALIAS] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+    connections.ensure_defaults(ALIAS)
+    connections.prepare_test_settings(ALIAS)
+    connection = connections[ALIAS]
+    original = getattr(connections._connections, 'default', None)
+    try:
+        setattr(connections._connections, 'default', connection)
+        with connection.schema_editor() as editor:
+            for model in models:
+                editor.create_model(model)
+        with ExitStack() as stack:
+            for model in models:
+                stack.enter_context(patch.object(model, 'objects', model._meta.default_manager))
+            yield connection
+    finally:
+        if original is None:
+            delattr(connections._connections, 'default')
+        else:
+            setattr(connections._connections, 'default', original)
+        connection.close()
+        del connections[ALIAS]
+        del connections.databases[ALIAS]